@@ -1,11 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
+from openai import OpenAI
 from app.agent.agent import Agent
+from app.agent.assistant_registry import assistant_registry
 from app.agent.prompts import instructions
-from app.agent.tools import get_order_status_function, look_up_data_function, get_estimated_delivery_date_function, escalate_to_human_function
+from app.agent.streaming import format_sse, SSE_HEADERS
+from app.agent.tools import available_functions
 from app.data.insert.document_processor import DocumentProcessor
-from app.config.config import get_db_config, get_embedding_config
+from app.data.insert.ingestion_jobs import IngestionJobStore, IngestionQueue
+from app.rag.retrieval_service import init_retrieval_service
+from app.config.config import get_db_config, get_db_pool_config, get_embedding_config, get_ingestion_config
 import os
+import uuid
 from flask_cors import CORS
 
 # Flask app initialization
@@ -19,8 +25,43 @@ UPLOAD_FOLDER = "app/data/input/"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
-# Initialize the document processor
-processor = DocumentProcessor(get_db_config(), get_embedding_config())
+# Services the endpoints use, started by create_app()
+processor = None
+retrieval_service = None
+ingestion_queue = None
+
+
+def create_app():
+    """
+    Start the document processor, retrieval service, ingestion workers and assistant cleanup,
+    and return the app. This runs at startup instead of on import: large PDFs are extracted in
+    spawned processes, which re-import the main module and must not start any of these.
+    WSGI servers use it as an app factory, e.g. gunicorn "agent_api:create_app()".
+    """
+    global processor, retrieval_service, ingestion_queue
+    if processor is not None:
+        return app
+
+    # Flask serves requests on several threads, so the processor uses a connection pool
+    processor = DocumentProcessor({**get_db_config(), **get_db_pool_config()}, get_embedding_config())
+
+    # One retrieval service for the whole process, sharing the processor's pool and embedding cache
+    retrieval_service = init_retrieval_service(
+        db_handler=processor.db_handler, embedding_handler=processor.embedding_handler)
+
+    # Background workers that ingest uploaded files; jobs survive restarts
+    ingestion_config = get_ingestion_config()
+    ingestion_queue = IngestionQueue(
+        processor.pdf_processor,
+        IngestionJobStore(ingestion_config["jobs_path"]),
+        workers=ingestion_config["workers"],
+        lease_seconds=ingestion_config["lease_seconds"]
+    )
+    ingestion_queue.start()
+
+    # Delete assistants left idle, e.g. by changed instructions or tool definitions
+    assistant_registry.cleanup_in_background(OpenAI())
+    return app
 
 # Agent endpoint
 
@@ -39,20 +80,14 @@ def agent_endpoint():
     if not question or not function_names:
         return jsonify({"error": "Missing question or functions"}), 400
     print(f"function_names: {function_names}")
-    # Available functions
-    available_functions = {
-        "get_order_status": get_order_status_function,
-        "get_estimated_delivery_date": get_estimated_delivery_date_function,
-        "escalate_to_human": escalate_to_human_function,
-        "look_up_data": look_up_data_function
-    }
     selected_functions = [available_functions[name]
                           for name in function_names if name in available_functions]
     if not selected_functions:
         return jsonify({"error": "Invalid functions provided"}), 400
     # Initialize agent
     agent = Agent(instructions=instructions,
-                  functions=selected_functions, agent_id=agent_id)
+                  functions=selected_functions, agent_id=agent_id,
+                  context={"retrieval_service": retrieval_service})
 
     # Send question to agent
     agent.send_message(question)
@@ -63,6 +98,35 @@ def agent_endpoint():
     else:
         return jsonify({"error": "No response from the agent"}), 500
 
+# Streaming agent endpoint: same request body, answer sent as server-sent events
+
+
+@app.route('/api/agent/stream', methods=['POST'])
+def agent_stream_endpoint():
+    data = request.get_json()
+    question = data.get("question")
+    function_names = data.get("functions")
+    agent_id = data.get("agent_id")
+    if not question or not function_names:
+        return jsonify({"error": "Missing question or functions"}), 400
+    selected_functions = [available_functions[name]
+                          for name in function_names if name in available_functions]
+    if not selected_functions:
+        return jsonify({"error": "Invalid functions provided"}), 400
+    agent = Agent(instructions=instructions,
+                  functions=selected_functions, agent_id=agent_id,
+                  context={"retrieval_service": retrieval_service})
+
+    def generate():
+        try:
+            for delta in agent.stream_message(question):
+                yield format_sse({"delta": delta})
+            yield format_sse({"response": agent.last_response}, event="done")
+        except Exception as e:
+            yield format_sse({"error": str(e)}, event="error")
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=SSE_HEADERS)
+
 # File upload endpoint
 
 
@@ -86,22 +150,33 @@ def upload_file():
     if file:
         # Save and process the file
         filename = secure_filename(file.filename)
-        file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
+        # A unique name, so a later upload of the same file can't replace it before it is ingested
+        file_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}_{filename}")
         file.save(file_path)
 
-        try:
-            processor.pdf_processor.process_pdf(
-                file_path,
-                source_name,
-                {"source": source_metadata},
-                chunk_type='static',
-                agent_id=agent_id
-            )
-            return jsonify({"message": f"File '{filename}' processed successfully for agent ID {agent_id}"}), 200
-        except Exception as e:
-            return jsonify({"error": f"Failed to process the file: {str(e)}"}), 500
+        # Ingest in the background; progress is available from /api/upload-status/<job_id>
+        job_id = ingestion_queue.submit(
+            file_path,
+            source_name,
+            {"source": source_metadata},
+            agent_id=agent_id,
+            chunk_type='static'
+        )
+        return jsonify({
+            "message": f"File '{filename}' queued for processing for agent ID {agent_id}",
+            "job_id": job_id,
+            "status_url": f"/api/upload-status/{job_id}"
+        }), 202
+
+
+@app.route('/api/upload-status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    status = ingestion_queue.status(job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job ID {job_id}"}), 404
+    return jsonify(status), 200
 
 
 # Start the app
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8000, debug=True)
+    create_app().run(host='0.0.0.0', port=8000, debug=True)
@@ -0,0 +1,192 @@
+"""
+ASGI version of agent_api.py with the same /api/agent and /api/upload-file contracts.
+
+Run with an ASGI server, for example:
+    hypercorn agent_api_async:app --bind 0.0.0.0:8000
+"""
+import os
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, request, jsonify, make_response
+from quart_cors import cors
+from werkzeug.utils import secure_filename
+from openai import OpenAI, AsyncOpenAI
+from app.agent.async_agent import AsyncAgent
+from app.agent.assistant_registry import assistant_registry
+from app.agent.prompts import instructions
+from app.agent.streaming import format_sse, SSE_HEADERS
+from app.agent.tools import available_functions
+from app.data.insert.document_processor import DocumentProcessor
+from app.data.insert.ingestion_jobs import IngestionJobStore, IngestionQueue
+from app.rag.retrieval_service import init_retrieval_service
+from app.config.config import get_db_config, get_db_pool_config, get_embedding_config, get_ingestion_config
+
+# Quart app initialization
+app = Quart(__name__)
+# Allow all origins for /api routes
+app = cors(app, allow_origin="*")
+
+# File upload folder
+UPLOAD_FOLDER = "app/data/input/"
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+
+# Threads for blocking work (tool calls, PDF ingestion); sized for many concurrent conversations
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", 64))
+
+# Services the endpoints use, started before the app serves its first request
+processor = None
+retrieval_service = None
+ingestion_queue = None
+openai_client = None
+
+
+@app.before_serving
+async def start_services():
+    """
+    Start the document processor, retrieval service, ingestion workers and assistant cleanup.
+    This runs at startup instead of on import: large PDFs are extracted in spawned processes,
+    which re-import the main module and must not start any of these.
+    """
+    global processor, retrieval_service, ingestion_queue, openai_client
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=TOOL_THREADS))
+
+    processor = DocumentProcessor({**get_db_config(), **get_db_pool_config()}, get_embedding_config())
+    retrieval_service = init_retrieval_service(
+        db_handler=processor.db_handler, embedding_handler=processor.embedding_handler)
+
+    # Background workers that ingest uploaded files; jobs survive restarts
+    ingestion_config = get_ingestion_config()
+    ingestion_queue = IngestionQueue(
+        processor.pdf_processor,
+        IngestionJobStore(ingestion_config["jobs_path"]),
+        workers=ingestion_config["workers"],
+        lease_seconds=ingestion_config["lease_seconds"]
+    )
+    ingestion_queue.start()
+
+    # Delete assistants left idle, e.g. by changed instructions or tool definitions
+    assistant_registry.cleanup_in_background(OpenAI())
+
+    # One async OpenAI client (and its connection pool) for every conversation
+    openai_client = AsyncOpenAI()
+
+
+# Agent endpoint
+
+
+@app.route('/api/agent', methods=['POST'])
+async def agent_endpoint():
+    data = await request.get_json()
+    question = data.get("question")
+    function_names = data.get("functions")
+    agent_id = data.get("agent_id")
+    if not question or not function_names:
+        return jsonify({"error": "Missing question or functions"}), 400
+
+    selected_functions = [available_functions[name]
+                          for name in function_names if name in available_functions]
+    if not selected_functions:
+        return jsonify({"error": "Invalid functions provided"}), 400
+
+    agent = AsyncAgent(instructions=instructions,
+                       functions=selected_functions, agent_id=agent_id,
+                       context={"retrieval_service": retrieval_service},
+                       client=openai_client)
+
+    # Send question to agent
+    await agent.send_message(question)
+    response = await agent.get_last_response()
+
+    if response:
+        return jsonify({"response": response}), 200
+    else:
+        return jsonify({"error": "No response from the agent"}), 500
+
+# Streaming agent endpoint: same request body, answer sent as server-sent events
+
+
+@app.route('/api/agent/stream', methods=['POST'])
+async def agent_stream_endpoint():
+    data = await request.get_json()
+    question = data.get("question")
+    function_names = data.get("functions")
+    agent_id = data.get("agent_id")
+    if not question or not function_names:
+        return jsonify({"error": "Missing question or functions"}), 400
+    selected_functions = [available_functions[name]
+                          for name in function_names if name in available_functions]
+    if not selected_functions:
+        return jsonify({"error": "Invalid functions provided"}), 400
+    agent = AsyncAgent(instructions=instructions,
+                       functions=selected_functions, agent_id=agent_id,
+                       context={"retrieval_service": retrieval_service},
+                       client=openai_client)
+
+    async def generate():
+        try:
+            async for delta in agent.stream_message(question):
+                yield format_sse({"delta": delta})
+            yield format_sse({"response": agent.last_response}, event="done")
+        except Exception as e:
+            yield format_sse({"error": str(e)}, event="error")
+
+    response = await make_response(generate(), SSE_HEADERS)
+    response.mimetype = "text/event-stream"
+    response.timeout = None  # Long answers must not hit Quart's response timeout
+    return response
+
+# File upload endpoint
+
+
+@app.route('/api/upload-file', methods=['POST'])
+async def upload_file():
+    files = await request.files
+    form = await request.form
+    if 'file' not in files:
+        return jsonify({"error": "No file part in the request"}), 400
+    file = files['file']
+    agent_id = form.get("agent_id")
+    source_name = form.get("source_name", "Uploaded Data")
+    source_metadata = {"source": form.get(
+        "source_metadata", "Custom Upload")}
+
+    if not agent_id:
+        return jsonify({"error": "Missing agent_id"}), 400
+
+    if file.filename == '':
+        return jsonify({"error": "No file selected"}), 400
+
+    filename = secure_filename(file.filename)
+    # A unique name, so a later upload of the same file can't replace it before it is ingested
+    file_path = os.path.join(app.config["UPLOAD_FOLDER"], f"{uuid.uuid4().hex}_{filename}")
+    await file.save(file_path)
+
+    # Ingest in the background; progress is available from /api/upload-status/<job_id>
+    job_id = await asyncio.to_thread(
+        ingestion_queue.submit,
+        file_path,
+        source_name,
+        {"source": source_metadata},
+        agent_id=agent_id,
+        chunk_type='static'
+    )
+    return jsonify({
+        "message": f"File '{filename}' queued for processing for agent ID {agent_id}",
+        "job_id": job_id,
+        "status_url": f"/api/upload-status/{job_id}"
+    }), 202
+
+
+@app.route('/api/upload-status/<job_id>', methods=['GET'])
+async def upload_status(job_id):
+    status = await asyncio.to_thread(ingestion_queue.status, job_id)
+    if status is None:
+        return jsonify({"error": f"Unknown job ID {job_id}"}), 404
+    return jsonify(status), 200
+
+
+# Start the app
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=8000)
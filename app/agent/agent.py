@@ -1,13 +1,21 @@
 # agent_core.py
 
+import os
 import json
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 from openai import OpenAI
+from app.agent.assistant_registry import assistant_registry
+
+# Shared by all agents so parallel tool calls stay bounded process-wide
+tool_executor = ThreadPoolExecutor(max_workers=int(os.getenv("TOOL_CONCURRENCY", 8)))
 
 
 class Agent:
-    def __init__(self, instructions, model="gpt-4o", functions=None,temperature=0.0, agent_id = None):
+    def __init__(self, instructions, model="gpt-4o", functions=None,temperature=0.0, agent_id = None, context=None):
         self.client = OpenAI()
+        self.context = context or {}  # Shared services passed to every tool call
         self.functions = {}
         self.tools = []
         self.model = model
@@ -22,13 +30,9 @@ class Agent:
             for function in functions:
                 self.add_function(function)
 
-        # Create the assistant
-        self.assistant = self.client.beta.assistants.create(
-            instructions=self.instructions,
-            model=self.model,
-            tools=self.tools
-        )
-        self.logger.info("Assistant created with model %s.", self.model)
+        # Reuse the assistant for this configuration, creating it only the first time
+        self.assistant_id = assistant_registry.get_or_create(
+            self.client, self.model, self.instructions, self.tools, self.temperature)
 
         self.thread = None  # Conversation thread
 
@@ -69,11 +73,56 @@ class Agent:
         )
         self._process_run()
 
+    def stream_message(self, content):
+        """
+        Send a message and yield the assistant's answer as text deltas while it is generated.
+        Tool calls are executed as soon as the run asks for them, and streaming resumes afterwards.
+        The complete answer is kept in self.last_response.
+        """
+        self.content = content
+        if not self.thread:
+            self.start_conversation()
+        self.logger.debug("User: %s", content)
+
+        self.client.beta.threads.messages.create(
+            thread_id=self.thread.id,
+            role="user",
+            content=content
+        )
+
+        parts = []
+        manager = self.client.beta.threads.runs.stream(
+            thread_id=self.thread.id,
+            assistant_id=self.assistant_id,
+            temperature=self.temperature
+        )
+        while manager is not None:
+            next_manager = None
+            with manager as stream:
+                for event in stream:
+                    if event.event == 'thread.message.delta':
+                        for block in event.data.delta.content or []:
+                            if block.type == 'text' and block.text and block.text.value:
+                                parts.append(block.text.value)
+                                yield block.text.value
+                    elif event.event == 'thread.run.requires_action':
+                        tool_outputs = self._handle_function_calls(
+                            event.data.required_action.submit_tool_outputs.tool_calls)
+                        next_manager = self.client.beta.threads.runs.submit_tool_outputs_stream(
+                            thread_id=self.thread.id,
+                            run_id=event.data.id,
+                            tool_outputs=tool_outputs
+                        )
+                    elif event.event in ('thread.run.failed', 'thread.run.expired', 'thread.run.cancelled'):
+                        self.logger.warning("Run status: %s", event.data.status)
+            manager = next_manager
+        self.last_response = "".join(parts)
+
     def _process_run(self):
         """Initiate a run and handle required actions."""
         run = self.client.beta.threads.runs.create_and_poll(
             thread_id=self.thread.id,
-            assistant_id=self.assistant.id,
+            assistant_id=self.assistant_id,
             temperature=self.temperature
         )
         print(f"Run status: {run.status}")
@@ -99,32 +148,69 @@ class Agent:
                 break
 
     def _handle_function_calls(self, tool_calls):
-        """Execute the functions requested by the assistant."""
-        tool_outputs = []
+        """
+        Execute the functions requested by the assistant.
+        Concurrency-safe functions run in parallel on the shared tool executor while the others
+        run one at a time. Every call is bounded by its function's timeout, and outputs are
+        returned in the order of tool_calls.
+        """
+        # Pass context to the function
+        context = {**self.context, 'thread_id': self.thread.id, 'question': self.content, 'agent_id': self.agent_id}
+        pending = []
         for tool_call in tool_calls:
             func_name = tool_call.function.name
             print(f"Running Function: {func_name}")
-            if func_name in self.functions:
-                args = json.loads(tool_call.function.arguments)
-                # Pass context to the function
-                context = {'thread_id': self.thread.id, 'question': self.content, 'agent_id': self.agent_id}
-                try:
-                    result = self.functions[func_name].execute(args=args, context=context)
-                except Exception as e:
-                    self.logger.error("Error executing function '%s': %s", func_name, str(e))
-                    result = f"Error executing function '{func_name}': {str(e)}"
-                tool_outputs.append({
-                    "tool_call_id": tool_call.id,
-                    "output": result
-                })
-            else:
+            function = self.functions.get(func_name)
+            if function is None:
                 self.logger.error("Function '%s' not found.", func_name)
-                tool_outputs.append({
-                    "tool_call_id": tool_call.id,
-                    "output": f"Function '{func_name}' not found."
-                })
+                pending.append((tool_call, None, f"Function '{func_name}' not found."))
+            elif function.concurrent_safe:
+                future = tool_executor.submit(self._execute_function, function, tool_call, context)
+                pending.append((tool_call, function, (future, time.monotonic())))
+            else:
+                pending.append((tool_call, function, None))
+
+        # Sequential functions run one at a time while the concurrent ones are in flight
+        results = {}
+        for position, (tool_call, function, state) in enumerate(pending):
+            if function is not None and state is None:
+                future = tool_executor.submit(self._execute_function, function, tool_call, context)
+                results[position] = self._wait_for_result(function, future, time.monotonic())
+
+        tool_outputs = []
+        for position, (tool_call, function, state) in enumerate(pending):
+            if position in results:
+                result = results[position]
+            elif function is None:
+                result = state
+            else:
+                result = self._wait_for_result(function, *state)
+            tool_outputs.append({
+                "tool_call_id": tool_call.id,
+                "output": result
+            })
         return tool_outputs
 
+    def _wait_for_result(self, function, future, started):
+        """Wait for a tool call until the function's timeout, counted from submission."""
+        timeout = None
+        if function.timeout is not None:
+            timeout = max(0.0, function.timeout - (time.monotonic() - started))
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            self.logger.error("Function '%s' timed out after %ss.", function.name, function.timeout)
+            return f"Function '{function.name}' timed out."
+
+    def _execute_function(self, function, tool_call, context):
+        """Run one tool call, turning exceptions into an error message for the assistant."""
+        try:
+            args = json.loads(tool_call.function.arguments)
+            return function.execute(args=args, context=context)
+        except Exception as e:
+            self.logger.error("Error executing function '%s': %s", function.name, str(e))
+            return f"Error executing function '{function.name}': {str(e)}"
+
     def get_messages(self):
         """Retrieve conversation messages."""
         messages = self.client.beta.threads.messages.list(
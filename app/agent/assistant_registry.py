@@ -0,0 +1,253 @@
+# assistant_registry.py
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from app.config.config import get_assistant_registry_config
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the file is then only merged within the process
+    fcntl = None
+
+
+class AssistantRegistry:
+    """
+    Creates each distinct OpenAI assistant once and reuses it across requests and restarts.
+    Assistants are keyed by (model, instructions hash, tool definitions, temperature),
+    and their ids are persisted in a local JSON file shared by every process on the host.
+    """
+
+    def __init__(self, path, touch_interval=3600, max_idle_days=30):
+        """
+        Args:
+            path (str): JSON file the assistant ids are stored in.
+            touch_interval (float): Minimum seconds between persisting 'last_used' updates of an entry.
+            max_idle_days (float): Default idle time after which cleanup deletes an assistant.
+        """
+        self.path = path
+        self.touch_interval = touch_interval
+        self.max_idle_days = max_idle_days
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._verified = set()  # Keys whose assistant was confirmed to exist in this process
+        # One lock per key, so concurrent first requests create a single assistant
+        self._key_locks = {}
+        self._async_key_locks = {}
+        self._entries = self._load()
+
+    @staticmethod
+    def make_key(model, instructions, tools, temperature):
+        # Full tool definitions, so changing a tool's parameters gets a new assistant
+        tool_definitions = sorted(json.dumps(tool, sort_keys=True) for tool in tools)
+        payload = json.dumps({
+            "model": model,
+            "instructions": hashlib.sha256(instructions.encode("utf-8")).hexdigest(),
+            "tools": tool_definitions,
+            "temperature": temperature
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_or_create(self, client, model, instructions, tools, temperature):
+        """
+        Return the id of the assistant for this configuration, creating it on first use.
+
+        Args:
+            client (OpenAI): Client used to verify or create the assistant.
+            model (str): Model name.
+            instructions (str): System instructions.
+            tools (list): Tool definitions.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            str: The assistant id.
+        """
+        key = self.make_key(model, instructions, tools, temperature)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            assistant_id = self._lookup(key)
+            if assistant_id and key not in self._verified:
+                # Confirm once per process that the stored assistant was not deleted remotely
+                try:
+                    client.beta.assistants.retrieve(assistant_id)
+                    self._verified.add(key)
+                except Exception as e:
+                    self.logger.warning("Stored assistant %s is unusable, recreating: %s", assistant_id, e)
+                    assistant_id = None
+            if assistant_id:
+                return assistant_id
+
+            assistant = client.beta.assistants.create(
+                instructions=instructions,
+                model=model,
+                tools=tools,
+                temperature=temperature
+            )
+            self.logger.info("Assistant created with model %s.", model)
+            self._store(key, assistant.id, model)
+            return assistant.id
+
+    async def aget_or_create(self, client, model, instructions, tools, temperature):
+        """
+        Async counterpart of get_or_create for an AsyncOpenAI client.
+        """
+        key = self.make_key(model, instructions, tools, temperature)
+        with self._lock:
+            key_lock = self._async_key_locks.setdefault(key, asyncio.Lock())
+        async with key_lock:
+            assistant_id = self._lookup(key)
+            if assistant_id and key not in self._verified:
+                try:
+                    await client.beta.assistants.retrieve(assistant_id)
+                    self._verified.add(key)
+                except Exception as e:
+                    self.logger.warning("Stored assistant %s is unusable, recreating: %s", assistant_id, e)
+                    assistant_id = None
+            if assistant_id:
+                return assistant_id
+
+            assistant = await client.beta.assistants.create(
+                instructions=instructions,
+                model=model,
+                tools=tools,
+                temperature=temperature
+            )
+            self.logger.info("Assistant created with model %s.", model)
+            self._store(key, assistant.id, model)
+            return assistant.id
+
+    def cleanup(self, client, max_idle_days=None):
+        """
+        Delete assistants that have not been used for max_idle_days (defaults to self.max_idle_days).
+
+        Returns:
+            list: Ids of the deleted assistants.
+        """
+        if max_idle_days is None:
+            max_idle_days = self.max_idle_days
+        cutoff = time.time() - max_idle_days * 86400
+        with self._lock:
+            # Include assistants created by other processes since this one last read the file
+            self._reload()
+            stale = {key: entry for key, entry in self._entries.items() if entry["last_used"] < cutoff}
+        deleted = []
+        for key, entry in stale.items():
+            try:
+                client.beta.assistants.delete(entry["assistant_id"])
+            except Exception as e:
+                self.logger.warning("Could not delete assistant %s: %s", entry["assistant_id"], e)
+            deleted.append(entry["assistant_id"])
+            with self._lock:
+                self._entries.pop(key, None)
+                self._verified.discard(key)
+        if deleted:
+            with self._lock:
+                self._save(removed=stale)
+        return deleted
+
+    def cleanup_in_background(self, client, max_idle_days=None):
+        """
+        Run cleanup once in a daemon thread, e.g. at application startup, so assistants left
+        behind by changed instructions or tools are eventually deleted.
+        """
+        def run():
+            try:
+                deleted = self.cleanup(client, max_idle_days)
+                if deleted:
+                    self.logger.info("Deleted %d idle assistants.", len(deleted))
+            except Exception as e:
+                self.logger.warning("Assistant cleanup failed: %s", e)
+
+        thread = threading.Thread(target=run, name="assistant-cleanup", daemon=True)
+        thread.start()
+        return thread
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Another process may have created it since this one last read the file
+                self._reload()
+                entry = self._entries.get(key)
+            if entry is None:
+                return None
+            now = time.time()
+            if now - entry["last_used"] > self.touch_interval:
+                entry["last_used"] = now
+                self._save()
+            return entry["assistant_id"]
+
+    def _store(self, key, assistant_id, model):
+        now = time.time()
+        with self._lock:
+            self._entries[key] = {
+                "assistant_id": assistant_id,
+                "model": model,
+                "created_at": now,
+                "last_used": now
+            }
+            self._verified.add(key)
+            self._save()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except (json.JSONDecodeError, OSError):
+            return {}
+
+    def _reload(self):
+        """
+        Add the entries other processes stored since this one last read the file.
+        Called with self._lock held.
+        """
+        with self._file_lock():
+            for key, entry in self._load().items():
+                self._entries.setdefault(key, entry)
+
+    def _save(self, removed=()):
+        """
+        Write this process's entries merged into the file's current ones, so processes sharing
+        the file never drop each other's assistants. Called with self._lock held.
+        Args:
+            removed (iterable): Keys deleted by cleanup, dropped from the file as well.
+        """
+        with self._file_lock():
+            entries = self._load()
+            for key, entry in self._entries.items():
+                stored = entries.get(key)
+                if stored is None or stored["last_used"] <= entry["last_used"]:
+                    entries[key] = entry
+            for key in removed:
+                entries.pop(key, None)
+            self._entries = entries
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(entries, f, indent=4)
+            os.replace(temp_path, self.path)
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock on a sidecar file, held for a read-merge-write of the registry file."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock_file:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+assistant_registry = AssistantRegistry(**get_assistant_registry_config())
@@ -0,0 +1,212 @@
+# async_agent.py
+
+import json
+import asyncio
+import logging
+from openai import AsyncOpenAI
+from app.agent.assistant_registry import assistant_registry
+
+
+class AsyncAgent:
+    """
+    Asyncio counterpart of Agent for the ASGI app. OpenAI calls are awaited on AsyncOpenAI,
+    and the (blocking) tool functions run in the event loop's thread pool.
+    """
+
+    def __init__(self, instructions, model="gpt-4o", functions=None, temperature=0.0, agent_id=None, context=None, client=None):
+        self.client = client or AsyncOpenAI()
+        self.functions = {}
+        self.tools = []
+        self.model = model
+        self.instructions = instructions
+        self.temperature = temperature
+        self.agent_id = agent_id
+        self.context = context or {}  # Shared services passed to every tool call
+        self.logger = logging.getLogger(__name__)
+        if functions:
+            for function in functions:
+                self.add_function(function)
+
+        self.assistant_id = None  # Looked up on first use, since __init__ can't await
+        self.thread = None  # Conversation thread
+
+    def add_function(self, function):
+        """Register a function as a tool for the assistant."""
+        func_metadata = {
+            "type": "function",
+            "function": {
+                "name": function.name,
+                "description": function.description,
+                "parameters": function.parameters,
+                "strict": True
+            }
+        }
+        self.tools.append(func_metadata)
+        self.functions[function.name] = function
+        self.logger.info("Registered function: %s", function.name)
+
+    async def _ensure_assistant(self):
+        if self.assistant_id is None:
+            # Reuse the assistant for this configuration, creating it only the first time
+            self.assistant_id = await assistant_registry.aget_or_create(
+                self.client, self.model, self.instructions, self.tools, self.temperature)
+
+    async def start_conversation(self):
+        """Create a new conversation thread."""
+        self.thread = await self.client.beta.threads.create()
+        self.logger.info("Conversation thread started with ID: %s", self.thread.id)
+
+    async def send_message(self, content):
+        """Send a message to the assistant and handle the response."""
+        self.content = content
+        await self._ensure_assistant()
+        if not self.thread:
+            await self.start_conversation()
+        self.logger.debug("User: %s", content)
+
+        await self.client.beta.threads.messages.create(
+            thread_id=self.thread.id,
+            role="user",
+            content=content
+        )
+        await self._process_run()
+
+    async def stream_message(self, content):
+        """
+        Send a message and yield the assistant's answer as text deltas while it is generated.
+        Tool calls are executed as soon as the run asks for them, and streaming resumes afterwards.
+        The complete answer is kept in self.last_response.
+        """
+        self.content = content
+        await self._ensure_assistant()
+        if not self.thread:
+            await self.start_conversation()
+        self.logger.debug("User: %s", content)
+
+        await self.client.beta.threads.messages.create(
+            thread_id=self.thread.id,
+            role="user",
+            content=content
+        )
+
+        parts = []
+        manager = self.client.beta.threads.runs.stream(
+            thread_id=self.thread.id,
+            assistant_id=self.assistant_id,
+            temperature=self.temperature
+        )
+        while manager is not None:
+            next_manager = None
+            async with manager as stream:
+                async for event in stream:
+                    if event.event == 'thread.message.delta':
+                        for block in event.data.delta.content or []:
+                            if block.type == 'text' and block.text and block.text.value:
+                                parts.append(block.text.value)
+                                yield block.text.value
+                    elif event.event == 'thread.run.requires_action':
+                        tool_outputs = await self._handle_function_calls(
+                            event.data.required_action.submit_tool_outputs.tool_calls)
+                        next_manager = self.client.beta.threads.runs.submit_tool_outputs_stream(
+                            thread_id=self.thread.id,
+                            run_id=event.data.id,
+                            tool_outputs=tool_outputs
+                        )
+                    elif event.event in ('thread.run.failed', 'thread.run.expired', 'thread.run.cancelled'):
+                        self.logger.warning("Run status: %s", event.data.status)
+            manager = next_manager
+        self.last_response = "".join(parts)
+
+    async def _process_run(self):
+        """Initiate a run and handle required actions."""
+        run = await self.client.beta.threads.runs.create_and_poll(
+            thread_id=self.thread.id,
+            assistant_id=self.assistant_id,
+            temperature=self.temperature
+        )
+        while run.status != 'completed':
+            if run.status == 'requires_action':
+                required_action = run.required_action
+                if required_action.type == 'submit_tool_outputs':
+                    tool_outputs = await self._handle_function_calls(
+                        required_action.submit_tool_outputs.tool_calls)
+                    run = await self.client.beta.threads.runs.submit_tool_outputs_and_poll(
+                        thread_id=self.thread.id,
+                        run_id=run.id,
+                        tool_outputs=tool_outputs
+                    )
+                else:
+                    self.logger.warning("Unknown required action: %s", required_action.type)
+                    break
+            else:
+                self.logger.warning("Run status: %s", run.status)
+                break
+
+    async def _handle_function_calls(self, tool_calls):
+        """
+        Execute the functions requested by the assistant.
+        Concurrency-safe functions run in parallel while the others run one at a time.
+        Every call is bounded by its function's timeout, and outputs keep the order of tool_calls.
+        """
+        context = {**self.context, 'thread_id': self.thread.id, 'question': self.content, 'agent_id': self.agent_id}
+        concurrent = {}
+        sequential = []
+        results = {}
+        for position, tool_call in enumerate(tool_calls):
+            function = self.functions.get(tool_call.function.name)
+            if function is None:
+                self.logger.error("Function '%s' not found.", tool_call.function.name)
+                results[position] = f"Function '{tool_call.function.name}' not found."
+            elif function.concurrent_safe:
+                concurrent[position] = asyncio.create_task(self._execute_function(function, tool_call, context))
+            else:
+                sequential.append((position, function, tool_call))
+
+        for position, function, tool_call in sequential:
+            results[position] = await self._execute_function(function, tool_call, context)
+        for position, task in concurrent.items():
+            results[position] = await task
+
+        return [
+            {"tool_call_id": tool_call.id, "output": results[position]}
+            for position, tool_call in enumerate(tool_calls)
+        ]
+
+    async def _execute_function(self, function, tool_call, context):
+        """Run one tool call, turning exceptions and timeouts into a message for the assistant."""
+        try:
+            args = json.loads(tool_call.function.arguments)
+            # Tools do blocking I/O (database, embeddings), so keep them off the event loop
+            return await asyncio.wait_for(
+                asyncio.to_thread(function.execute, args=args, context=context), function.timeout)
+        except asyncio.TimeoutError:
+            self.logger.error("Function '%s' timed out after %ss.", function.name, function.timeout)
+            return f"Function '{function.name}' timed out."
+        except Exception as e:
+            self.logger.error("Error executing function '%s': %s", function.name, str(e))
+            return f"Error executing function '{function.name}': {str(e)}"
+
+    async def get_messages(self):
+        """Retrieve conversation messages."""
+        messages = await self.client.beta.threads.messages.list(
+            thread_id=self.thread.id
+        )
+        processed_messages = []
+        for message in messages.data:
+            text_content = ''
+            for content_block in message.content:
+                if content_block.type == 'text':
+                    text_content += content_block.text.value
+            processed_messages.append({
+                'role': message.role,
+                'content': text_content
+            })
+        return processed_messages
+
+    async def get_last_response(self):
+        """Retrieve the assistant's last response."""
+        messages = await self.get_messages()
+        for message in messages:
+            if message['role'] == 'assistant':
+                return message['content']
+        return None
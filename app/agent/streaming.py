@@ -0,0 +1,24 @@
+# streaming.py
+
+import json
+
+
+def format_sse(data, event=None):
+    """
+    Format one server-sent event.
+    Args:
+        data (dict): JSON payload of the event.
+        event (str, optional): Event name; clients treat unnamed events as 'message'.
+    Returns:
+        str: The event, terminated by a blank line.
+    """
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"  # Stop nginx/ngrok style proxies from buffering the stream
+}
@@ -1,59 +1,61 @@
 # function.py
 
-import json
-import os
-from app.data.input.orders import df_orders
-from app.data.handlers.db_handler import DatabaseHandler
-from app.data.handlers.embedding_handler import EmbeddingHandler
-from app.config.config import get_db_config
-import os
-from app.rag.rag import RAGPipeline
+from app.data.handlers.order_store import get_order_store
+from app.data.handlers.escalation_store import get_escalation_store
+from app.rag.retrieval_service import get_retrieval_service
 
 class Function:
-    def __init__(self, func, name, description, parameters):
+    def __init__(self, func, name, description, parameters, concurrent_safe=True, timeout=None):
         self.func = func  # The actual Python function
         self.name = name
         self.description = description
         self.parameters = parameters
+        self.concurrent_safe = concurrent_safe  # May run alongside other tool calls of the same step
+        self.timeout = timeout  # Seconds before the agent stops waiting for the result
 
     def execute(self, args, context):
         """Execute the encapsulated function with provided arguments and context."""
         return self.func(args=args, context=context)
 
+def _requested_orders(args):
+    """Order numbers from either the 'order_numbers' list or a single 'order_number'."""
+    order_numbers = args.get('order_numbers') or []
+    if args.get('order_number'):
+        order_numbers = [args['order_number']] + list(order_numbers)
+    return list(dict.fromkeys(str(number) for number in order_numbers))
+
+def _lookup_orders(args, context, column, found_message):
+    order_numbers = _requested_orders(args)
+    if not order_numbers:
+        return "Order number is missing."
+
+    # One lookup for every order in the call, through the injected or process-wide store
+    order_store = context.get('order_store') or get_order_store()
+    orders = order_store.get_many(order_numbers)
+    return "\n".join(
+        found_message.format(order_number=number, value=orders[number][column])
+        if number in orders else f"Order number {number} not found."
+        for number in order_numbers
+    )
+
 def get_order_status(args, context):
     """
-    Retrieve the current status of an order given its order number.
+    Retrieve the current status of one or more orders given their order numbers.
     """
-    order_number = args.get('order_number')
-    if not order_number:
-        return "Order number is missing."
-
-    order_number = str(order_number)
-    status = df_orders.loc[df_orders['order_number'] == order_number, 'status']
-    if not status.empty:
-        return f"The status of order number {order_number} is {status.values[0]}."
-    else:
-        return f"Order number {order_number} not found."
+    return _lookup_orders(args, context, 'status', "The status of order number {order_number} is {value}.")
 
 def get_estimated_delivery_date(args, context):
     """
-    Provide the estimated delivery date for an order given its order number.
+    Provide the estimated delivery date for one or more orders given their order numbers.
     """
-    order_number = args.get('order_number')
-    if not order_number:
-        return "Order number is missing."
-
-    order_number = str(order_number)
-    delivery_date = df_orders.loc[df_orders['order_number'] == order_number, 'estimated_delivery']
-    if not delivery_date.empty:
-        return f"The estimated delivery date for order number {order_number} is {delivery_date.values[0]}."
-    else:
-        return f"Order number {order_number} not found."
+    return _lookup_orders(
+        args, context, 'estimated_delivery',
+        "The estimated delivery date for order number {order_number} is {value}.")
 
 def escalate_to_human(args, context):
     """
-    Escalate the conversation to a human by saving the thread ID, reason, and contact info to a JSON file.
-    Ensures the directory and file exist, and creates them if necessary.
+    Escalate the conversation to a human by appending the thread ID, reason, and contact info
+    to the escalation store read by the human-support queue.
     """
     reason = args.get('reason')
     contact_info = args.get('contact_info')
@@ -62,41 +64,12 @@ def escalate_to_human(args, context):
     if not reason or not contact_info:
         return "Reason and contact information are required to escalate."
 
-    # Define the absolute file path
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    file_path = os.path.join(base_dir, '../data/output/escalations.json')
-    directory = os.path.dirname(file_path)
-
-    # Ensure the directory exists
-    os.makedirs(directory, exist_ok=True)
-
-    # Initialize escalations list
-    escalations = []
-
-    # Check if the file exists and load existing data
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r') as f:
-                escalations = json.load(f)
-                if not isinstance(escalations, list):
-                    raise ValueError("Invalid data format in JSON file")
-        except (json.JSONDecodeError, ValueError):
-            # Handle invalid JSON or format by resetting to an empty list
-            escalations = []
-
-    # Create the escalation entry
-    escalation_data = {
+    escalation_store = context.get('escalation_store') or get_escalation_store()
+    escalation_store.append({
         'thread_id': thread_id,
         'reason': reason,
         'contact_info': contact_info
-    }
-
-    # Append the new escalation
-    escalations.append(escalation_data)
-
-    # Write the updated list back to the file
-    with open(file_path, 'w') as f:
-        json.dump(escalations, f, indent=4)
+    })
 
     return "Thank you. I've escalated your request to a human representative, and they will contact you shortly."
 
@@ -108,16 +81,9 @@ def look_up_data(args, context):
     question = context.get('question')
     agent_id = context.get('agent_id')
     print(agent_id)
-    # Initialize Database and Embedding handlers
-    db_handler = DatabaseHandler(**get_db_config())
-    embedding_handler = EmbeddingHandler(
-        model_name="openai",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
-
-    # Initialize RAG pipeline
-    rag_pipeline = RAGPipeline(db_handler, embedding_handler)
-    answers = rag_pipeline.retrieve(query=question, agent_id= agent_id)
+    # Reuse the long-lived service injected by the app, or the process-wide default
+    retrieval_service = context.get('retrieval_service') or get_retrieval_service()
+    answers = retrieval_service.retrieve(query=question, agent_id=agent_id)
 
     # Format the answers as a structured string
     formatted_answers = "\n".join([
@@ -133,35 +99,39 @@ def look_up_data(args, context):
 get_order_status_function = Function(
     func=get_order_status,
     name="get_order_status",
-    description="Retrieve the current status of an order given its order number.",
+    description="Retrieve the current status of one or more orders given their order numbers.",
     parameters={
         "type": "object",
         "properties": {
-            "order_number": {
-                "type": "string",
-                "description": "The unique order number assigned to the customer's order."
+            "order_numbers": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "The unique order numbers assigned to the customer's orders; one or more."
             }
         },
-        "required": ["order_number"],
+        "required": ["order_numbers"],
         "additionalProperties": False
-    }
+    },
+    timeout=10
 )
 
 get_estimated_delivery_date_function = Function(
     func=get_estimated_delivery_date,
     name="get_estimated_delivery_date",
-    description="Provide the estimated delivery date for an order given its order number.",
+    description="Provide the estimated delivery date for one or more orders given their order numbers.",
     parameters={
         "type": "object",
         "properties": {
-            "order_number": {
-                "type": "string",
-                "description": "The unique order number assigned to the customer's order."
+            "order_numbers": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "The unique order numbers assigned to the customer's orders; one or more."
             }
         },
-        "required": ["order_number"],
+        "required": ["order_numbers"],
         "additionalProperties": False
-    }
+    },
+    timeout=10
 )
 
 escalate_to_human_function = Function(
@@ -182,7 +152,9 @@ escalate_to_human_function = Function(
         },
         "required": ["reason", "contact_info"],
         "additionalProperties": False
-    }
+    },
+    # Appends to the escalation log, so several escalations of one step are stored one at a time, in order
+    concurrent_safe=False
 )
 
 look_up_data_function = Function(
@@ -199,5 +171,14 @@ look_up_data_function = Function(
         },
         "required": ["source"],
         "additionalProperties": False
-    }
-)
\ No newline at end of file
+    },
+    timeout=30
+)
+
+# Functions the API can expose to an agent, by name
+available_functions = {
+    "get_order_status": get_order_status_function,
+    "get_estimated_delivery_date": get_estimated_delivery_date_function,
+    "escalate_to_human": escalate_to_human_function,
+    "look_up_data": look_up_data_function
+}
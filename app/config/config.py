@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import json
 
 load_dotenv()
 
@@ -14,10 +15,136 @@ def get_db_config():
     }
     return db_config
 
+def get_db_pool_config():
+# Connection pool settings for long-running, multi-threaded processes such as the API
+    db_pool_config = {
+        "pooled": True,
+        # Connections stay open up to the pool size; fewer are closed and reopened under load
+        "min_connections": int(os.getenv("DB_POOL_MIN", os.getenv("DB_POOL_MAX", 10))),
+        "max_connections": int(os.getenv("DB_POOL_MAX", 10)),
+        "health_check_interval": float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", 30)),
+    }
+    return db_pool_config
+
 def get_embedding_config():
 # Initialize database handler for dynamic updates
     embedding_config = {
         "model_name": "openai",
-        "openai_api_key": os.getenv("OPENAI_API_KEY")
+        "openai_api_key": os.getenv("OPENAI_API_KEY"),
+        "cache_config": get_embedding_cache_config()
+    }
+    return embedding_config
+
+def get_vector_index_config():
+# Approximate nearest neighbour index created on pgvector embedding columns. HNSW is the default;
+# IVFFlat is built after the first bulk load and needs a REINDEX once the data has grown
+    vector_index_config = {
+        "method": os.getenv("VECTOR_INDEX_METHOD", "hnsw"),
+        "m": int(os.getenv("HNSW_M", 16)),
+        "ef_construction": int(os.getenv("HNSW_EF_CONSTRUCTION", 64)),
+        "lists": int(os.getenv("IVFFLAT_LISTS", 100)),
+    }
+    return vector_index_config
+
+def get_retrieval_config():
+# 'memory' ranks in the in-process vector index, 'database' pushes top-k into Postgres
+    retrieval_config = {
+        "search_mode": os.getenv("VECTOR_SEARCH_MODE", "memory"),
+        "ef_search": int(os.getenv("HNSW_EF_SEARCH", 40)),
+        "probes": int(os.getenv("IVFFLAT_PROBES", 10)),
+        # Rows per round trip when streaming an agent's corpus into its in-memory index
+        "load_batch_size": int(os.getenv("INDEX_LOAD_BATCH_SIZE", 2000)),
+        "reranker_config": get_reranker_config(),
+    }
+    return retrieval_config
+
+def get_reranker_config():
+# Default reranker, per-agent overrides (AGENT_RERANKERS='{"12345": "cross-encoder"}') and backend options
+    cache_size = int(os.getenv("RERANK_CACHE_SIZE", 1024))
+    reranker_config = {
+        "default": os.getenv("RERANKER", "cohere"),
+        "agents": json.loads(os.getenv("AGENT_RERANKERS", "{}")),
+        "options": {
+            "cohere": {
+                "model": os.getenv("COHERE_RERANK_MODEL", "rerank-english-v2.0"),
+                "cache_size": cache_size,
+            },
+            "cross-encoder": {
+                "model_name": os.getenv("CROSS_ENCODER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                "backend": os.getenv("CROSS_ENCODER_BACKEND", "torch"),
+                "batch_size": int(os.getenv("CROSS_ENCODER_BATCH_SIZE", 32)),
+                "cache_size": cache_size,
+            },
+        },
+    }
+    return reranker_config
+
+def get_embedding_cache_config():
+# Two-tier embedding cache; returns None when EMBEDDING_CACHE_ENABLED is false
+    if os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    embedding_cache_config = {
+        "max_memory_bytes": int(float(os.getenv("EMBEDDING_CACHE_MEMORY_MB", 64)) * 1024 * 1024),
+        "disk_path": os.getenv("EMBEDDING_CACHE_PATH", "app/data/output/embedding_cache.sqlite3") or None,
+    }
+    return embedding_cache_config
+
+def get_keyword_index_config():
+# Directory where the per-agent BM25 inverted indexes are persisted
+    keyword_index_config = {
+        "index_dir": os.getenv("KEYWORD_INDEX_DIR", "app/data/output/keyword_index"),
+    }
+    return keyword_index_config
+
+def get_assistant_registry_config():
+# Where the ids of reusable OpenAI assistants are persisted
+    assistant_registry_config = {
+        "path": os.getenv("ASSISTANT_REGISTRY_PATH", "app/data/output/assistants.json"),
+        # Assistants unused for this long are deleted at startup
+        "max_idle_days": float(os.getenv("ASSISTANT_MAX_IDLE_DAYS", 30)),
+    }
+    return assistant_registry_config
+
+def get_ingestion_config():
+# Background ingestion workers behind /api/upload-file
+    ingestion_config = {
+        "jobs_path": os.getenv("INGESTION_JOBS_PATH", "app/data/output/ingestion_jobs.sqlite3"),
+        "workers": int(os.getenv("INGESTION_WORKERS", 2)),
+        "lease_seconds": float(os.getenv("INGESTION_LEASE_SECONDS", 300)),
+    }
+    return ingestion_config
+
+def get_agentic_chunking_config():
+# LLM batch dispatch for agentic chunking; budgets are shared by every document being chunked
+    rpm = os.getenv("AGENTIC_CHUNKING_RPM")
+    tpm = os.getenv("AGENTIC_CHUNKING_TPM")
+    agentic_chunking_config = {
+        "model": os.getenv("AGENTIC_CHUNKING_MODEL", "gpt-4o-mini"),
+        "max_concurrency": int(os.getenv("AGENTIC_CHUNKING_CONCURRENCY", 4)),
+        "requests_per_minute": int(rpm) if rpm else None,
+        "tokens_per_minute": int(tpm) if tpm else None,
+        "max_retries": int(os.getenv("AGENTIC_CHUNKING_MAX_RETRIES", 5)),
+        "cache_path": os.getenv("AGENTIC_CHUNK_CACHE_PATH", "app/data/output/chunk_cache.sqlite3") or None,
+    }
+    return agentic_chunking_config
+
+def get_order_store_config():
+# Where order tools look up orders: the in-memory frame or a Postgres table, behind a short-lived cache
+    order_store_config = {
+        "backend": os.getenv("ORDER_STORE_BACKEND", "frame"),
+        "table_name": os.getenv("ORDER_STORE_TABLE", "orders"),
+        "cache_ttl": float(os.getenv("ORDER_CACHE_TTL", 30)),
+        "cache_size": int(os.getenv("ORDER_CACHE_SIZE", 10000)),
+    }
+    return order_store_config
+
+def get_escalation_config():
+# Append-only JSON Lines file read by the human-support queue
+    escalation_config = {
+        "path": os.getenv("ESCALATIONS_PATH", "app/data/output/escalations.jsonl"),
+        "batch_size": int(os.getenv("ESCALATION_BATCH_SIZE", 100)),
+        "flush_interval": float(os.getenv("ESCALATION_FLUSH_INTERVAL", 0)),
+        # Entries of the old single-JSON-document file are imported on first use
+        "legacy_path": os.getenv("LEGACY_ESCALATIONS_PATH", "app/data/output/escalations.json"),
     }
-    return embedding_config
\ No newline at end of file
+    return escalation_config
@@ -1,17 +1,210 @@
+import re
+import json
+import time
+import uuid
+import weakref
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.errors import FeatureNotSupported, InvalidSqlStatementName
+from psycopg2.extras import RealDictCursor, execute_values
+from app.data.handlers.vector_codec import register_vector_codec, decode_embeddings
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+COMPARISON_OPERATORS = ('=', '!=', '<', '<=', '>', '>=')
+
+
+def _column(name):
+    if not IDENTIFIER.match(name):
+        raise ValueError(f"Invalid column name: {name}")
+    return name
+
+
+def build_conditions(filters):
+    """
+    Turn structured filters into a WHERE clause with %s placeholders and its parameters.
+    Each filter is a (column, operator, value) tuple, or (column, value) for equality.
+    Operators: =, !=, <, <=, >, >=, in, not in, is null, is not null and @> (JSONB containment).
+    A column written as 'metadata.key' filters on a key of a JSONB column; equality on a key
+    is expressed as containment so it can use a GIN index on the column.
+    Args:
+        filters (list): The filters, combined with AND.
+    Returns:
+        tuple: (conditions string, list of parameters); ('', []) when there are no filters.
+    """
+    clauses = []
+    params = []
+    for condition in filters or []:
+        if len(condition) == 2:
+            column, operator, value = condition[0], '=', condition[1]
+        else:
+            column, operator, value = condition
+        operator = operator.lower()
+        if '.' in column:
+            column, key = column.split('.', 1)
+            column = _column(column)
+            if operator == '=' and value is not None:
+                clauses.append(f"{column} @> %s::jsonb")
+                params.append(json.dumps({key: value}))
+                continue
+            # Other comparisons work on the key's text value, cast to numeric for numbers
+            params.append(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                target = f"(({column} ->> %s)::numeric)"
+            else:
+                target = f"({column} ->> %s)"
+                if operator in ('in', 'not in'):
+                    value = [str(item) for item in value]
+                elif value is not None:
+                    value = str(value)
+        else:
+            target = _column(column)
+
+        if operator == '=' and value is None:
+            operator = 'is null'
+        elif operator == '!=' and value is None:
+            operator = 'is not null'
+
+        if operator in COMPARISON_OPERATORS:
+            clauses.append(f"{target} {operator} %s")
+            params.append(value)
+        elif operator == 'in':
+            clauses.append(f"{target} = ANY(%s)")
+            params.append(list(value))
+        elif operator == 'not in':
+            clauses.append(f"NOT ({target} = ANY(%s))")
+            params.append(list(value))
+        elif operator == 'is null':
+            clauses.append(f"{target} IS NULL")
+        elif operator == 'is not null':
+            clauses.append(f"{target} IS NOT NULL")
+        elif operator == '@>':
+            clauses.append(f"{target} @> %s::jsonb")
+            params.append(json.dumps(value))
+        else:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+    return " AND ".join(clauses), params
+
 
 class DatabaseHandler:
-    def __init__(self, dbname, user, password, host='127.0.0.1', port=5432):
-        """Initialize the database connection."""
-        self.connection = psycopg2.connect(
-            dbname=dbname,
-            user=user,
-            password=password,
-            host=host,
-            port=port
-        )
-        self.cursor = self.connection.cursor(cursor_factory=RealDictCursor)
+    def __init__(self, dbname, user, password, host='127.0.0.1', port=5432,
+                 pooled=False, min_connections=None, max_connections=10, health_check_interval=30):
+        """
+        Initialize the database connection.
+        Args:
+            pooled (bool): Use a thread-safe connection pool instead of a single connection.
+            min_connections (int, optional): Connections the pool keeps open. The pool closes
+                connections returned beyond this number, so it defaults to max_connections.
+            max_connections (int): Upper bound on open connections; callers wait when all are busy.
+            health_check_interval (float): Seconds a pooled connection may sit idle before it is
+                checked with 'SELECT 1' on checkout.
+        """
+        connect_kwargs = {
+            "dbname": dbname,
+            "user": user,
+            "password": password,
+            "host": host,
+            "port": port
+        }
+        self.pooled = pooled
+        self.health_check_interval = health_check_interval
+        # Keyed by the connection object: a new connection can reuse a closed one's id()
+        self._last_used = weakref.WeakKeyDictionary()
+        self._prepared = weakref.WeakKeyDictionary()  # connection -> names of the statements prepared on it
+        if pooled:
+            if min_connections is None:
+                min_connections = max_connections
+            self.pool = ThreadedConnectionPool(min_connections, max_connections, **connect_kwargs)
+            # ThreadedConnectionPool raises instead of waiting when exhausted
+            self._slots = threading.BoundedSemaphore(max_connections)
+            self.connection = None
+        else:
+            self.pool = None
+            self.connection = psycopg2.connect(**connect_kwargs)
+            # Decode vector and float array columns straight into NumPy arrays
+            register_vector_codec(self.connection)
+            self._connection_lock = threading.RLock()
+
+    @contextmanager
+    def _transaction(self, cursor_name=None):
+        """
+        Yield a fresh cursor and commit when the block succeeds, roll back when it raises.
+        Pooled handlers check a connection out of the pool for the duration of the block;
+        single-connection handlers serialize blocks on their one connection.
+        A cursor_name makes it a server-side cursor that fetches rows on demand.
+        """
+        if not self.pooled:
+            with self._connection_lock:
+                cursor = self.connection.cursor(name=cursor_name, cursor_factory=RealDictCursor)
+                try:
+                    yield cursor
+                    self.connection.commit()
+                except Exception:
+                    self.connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            return
+
+        with self._slots:
+            connection = self._checkout()
+            broken = False
+            try:
+                cursor = connection.cursor(name=cursor_name, cursor_factory=RealDictCursor)
+                try:
+                    yield cursor
+                    connection.commit()
+                except Exception:
+                    if connection.closed:
+                        broken = True
+                    else:
+                        connection.rollback()
+                    raise
+                finally:
+                    if not connection.closed:
+                        cursor.close()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                if not broken:
+                    self._last_used[connection] = time.monotonic()
+                self._release(connection, broken)
+
+    def _checkout(self):
+        """Take a healthy connection from the pool, replacing ones the server dropped."""
+        while True:
+            connection = self.pool.getconn()
+            last_used = self._last_used.get(connection)
+            if last_used is None:
+                # First checkout of this connection
+                try:
+                    register_vector_codec(connection)
+                except Exception:
+                    self._release(connection, broken=True)
+                    raise
+                return connection
+            if connection.closed:
+                self._release(connection, broken=True)
+                continue
+            if time.monotonic() - last_used < self.health_check_interval:
+                return connection
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+                return connection
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                self._release(connection, broken=True)
+
+    def _release(self, connection, broken=False):
+        if broken:
+            self._last_used.pop(connection, None)
+            self._prepared.pop(connection, None)
+        self.pool.putconn(connection, close=broken)
 
     def create_table(self, table_name, columns):
         """
@@ -22,8 +215,9 @@ class DatabaseHandler:
         """
         column_definitions = ", ".join([f"{col} {dtype}" for col, dtype in columns.items()])
         query = f"CREATE TABLE IF NOT EXISTS {table_name} ({column_definitions});"
-        self.cursor.execute(query)
-        self.connection.commit()
+        with self._transaction() as cursor:
+            cursor.execute(query)
+        self._prepared.clear()
 
     def insert_row(self, table_name, data, conflict_column=None, update_on_conflict=True):
         """
@@ -38,39 +232,82 @@ class DatabaseHandler:
         placeholders = ", ".join(["%s"] * len(data))
         values = tuple(data.values())
 
-        if conflict_column and update_on_conflict:
-            update_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in data.keys()])
-            query = f"""
-            INSERT INTO {table_name} ({columns}) 
-            VALUES ({placeholders}) 
-            ON CONFLICT ({conflict_column}) 
-            DO UPDATE SET {update_clause}
-            """
-        elif conflict_column:
-            query = f"""
-            INSERT INTO {table_name} ({columns}) 
-            VALUES ({placeholders}) 
-            ON CONFLICT ({conflict_column}) 
-            DO NOTHING
-            """
-        else:
-            query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        query += self._conflict_clause(data.keys(), conflict_column, update_on_conflict)
 
         try:
-            self.cursor.execute(query, values)
-            self.connection.commit()
+            with self._transaction() as cursor:
+                cursor.execute(query, values)
         except Exception as e:
-            self.connection.rollback()  # Rollback transaction in case of error
             raise Exception(f"Error inserting row into {table_name}: {str(e)}")
 
-    def fetch_data(self, table_name, columns=None, conditions=None, limit=None):
+    def insert_many(self, table_name, rows, conflict_column=None, update_on_conflict=True,
+                    page_size=500, returning=None):
+        """
+        Insert many rows in a single transaction using multi-row VALUES statements.
+        Every page runs under its own savepoint, so a bad page is reported and skipped
+        without losing the rest of the batch.
+        Args:
+            table_name (str): Name of the table.
+            rows (list): Dicts with the same column names and their values.
+            conflict_column (str): The column to check for conflicts (e.g., 'table_name').
+            update_on_conflict (bool): Whether to update the row if a conflict occurs.
+            page_size (int): Number of rows sent per statement.
+            returning (list, optional): Columns to return for the inserted rows (e.g., ['id']).
+        Returns:
+            dict: 'inserted' row count, 'failed' list of {'start', 'end', 'error'} for rejected
+                pages (row offsets into rows), and 'returned' rows when returning is set.
+        """
+        result = {"inserted": 0, "failed": [], "returned": []}
+        if not rows:
+            return result
+
+        column_names = list(rows[0].keys())
+        query = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES %s"
+        query += self._conflict_clause(column_names, conflict_column, update_on_conflict)
+        if returning:
+            query += f" RETURNING {', '.join(returning)}"
+
+        try:
+            with self._transaction() as cursor:
+                for start in range(0, len(rows), page_size):
+                    page = rows[start:start + page_size]
+                    values = [tuple(row[col] for col in column_names) for row in page]
+                    cursor.execute("SAVEPOINT insert_many_page")
+                    try:
+                        returned = execute_values(
+                            cursor, query, values, page_size=len(values), fetch=bool(returning))
+                        cursor.execute("RELEASE SAVEPOINT insert_many_page")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT insert_many_page")
+                        result["failed"].append({"start": start, "end": start + len(page), "error": str(e)})
+                        continue
+                    result["inserted"] += cursor.rowcount if not returning else len(returned)
+                    if returning:
+                        result["returned"].extend(returned)
+        except Exception as e:
+            raise Exception(f"Error inserting rows into {table_name}: {str(e)}")
+        return result
+
+    @staticmethod
+    def _conflict_clause(columns, conflict_column, update_on_conflict):
+        """Build the ON CONFLICT part of an INSERT statement."""
+        if conflict_column and update_on_conflict:
+            update_clause = ", ".join([f"{col} = EXCLUDED.{col}" for col in columns])
+            return f" ON CONFLICT ({conflict_column}) DO UPDATE SET {update_clause}"
+        elif conflict_column:
+            return f" ON CONFLICT ({conflict_column}) DO NOTHING"
+        return ""
+
+    def fetch_data(self, table_name, columns=None, conditions=None, limit=None, params=None):
         """
         Fetch data from a table.
         Args:
             table_name (str): Name of the table.
             columns (list, optional): List of columns to retrieve. Defaults to None (all columns).
-            conditions (str, optional): SQL WHERE conditions. Defaults to None.
+            conditions (str, optional): SQL WHERE conditions, optionally with %s placeholders. Defaults to None.
             limit (int, optional): Number of rows to fetch. Defaults to None.
+            params (tuple, optional): Values bound to the placeholders in conditions.
         Returns:
             list: List of fetched rows.
         """
@@ -84,34 +321,323 @@ class DatabaseHandler:
             query += f" WHERE {conditions}"
         if limit:
             query += f" LIMIT {limit}"
-        self.cursor.execute(query)
-        rows = self.cursor.fetchall()
+        with self._transaction() as cursor:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        return rows
+
+    def iter_data(self, table_name, columns=None, conditions=None, params=None, filters=None, itersize=2000):
+        """
+        Stream rows from a table through a server-side cursor, which transfers itersize rows
+        per round trip so only one batch is held in memory at a time. The connection stays
+        in use until the iterator is exhausted or closed.
+        Args:
+            table_name (str): Name of the table.
+            columns (list, optional): List of columns to retrieve. Defaults to None (all columns).
+            conditions (str, optional): SQL WHERE conditions, optionally with %s placeholders.
+            params (tuple, optional): Values bound to the placeholders in conditions.
+            filters (list, optional): Structured filters (see build_conditions), combined with conditions.
+            itersize (int): Rows fetched from the server per round trip.
+        Yields:
+            dict: One row at a time.
+        """
+        query, values = self._select_query(table_name, columns, conditions, params, filters)
+        with self._transaction(cursor_name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, values)
+            for row in cursor:
+                yield row
+
+    def iter_batches(self, table_name, columns=None, conditions=None, params=None, filters=None,
+                     batch_size=2000, embedding_column=None):
+        """
+        Stream a table in column-oriented batches through a server-side cursor.
+        Args:
+            table_name (str): Name of the table.
+            columns (list, optional): List of columns to retrieve. Defaults to None (all columns).
+            conditions (str, optional): SQL WHERE conditions, optionally with %s placeholders.
+            params (tuple, optional): Values bound to the placeholders in conditions.
+            filters (list, optional): Structured filters (see build_conditions), combined with conditions.
+            batch_size (int): Rows per batch, fetched from the server in one round trip.
+            embedding_column (str, optional): Column decoded into a float32 matrix of shape
+                (rows, dim). Rows whose embedding is missing or malformed are left out of the batch.
+        Yields:
+            dict: Column name -> list of up to batch_size values (the matrix for embedding_column).
+        """
+        query, values = self._select_query(table_name, columns, conditions, params, filters)
+        dim = None
+        with self._transaction(cursor_name=f"stream_{uuid.uuid4().hex}") as cursor:
+            cursor.execute(query, values)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                names = [column.name for column in cursor.description]
+                matrix = None
+                if embedding_column:
+                    matrix, valid = decode_embeddings([row[embedding_column] for row in rows], dim)
+                    if not valid.all():
+                        for i in np.flatnonzero(~valid):
+                            print(f"Error processing record: {rows[i]}")
+                        rows = [row for row, ok in zip(rows, valid) if ok]
+                        matrix = matrix[valid]
+                    if not rows:
+                        continue
+                    # Later batches must stack onto the first one
+                    dim = matrix.shape[1]
+                batch = {name: [row[name] for row in rows] for name in names if name != embedding_column}
+                if embedding_column:
+                    batch[embedding_column] = matrix
+                yield batch
+
+    def _select_query(self, table_name, columns, conditions, params, filters):
+        """
+        Build a SELECT combining raw conditions with structured filters.
+        Returns:
+            tuple: (query, list of parameters).
+        """
+        columns_str = ", ".join(columns) if columns else "*"
+        query = f"SELECT {columns_str} FROM {table_name}"
+        values = list(params or ())
+        clauses = [conditions] if conditions else []
+        filter_conditions, filter_params = build_conditions(filters)
+        if filter_conditions:
+            clauses.append(filter_conditions)
+            values.extend(filter_params)
+        if clauses:
+            query += " WHERE " + " AND ".join(f"({clause})" for clause in clauses)
+        return query, values
+
+    def select(self, table_name, columns=None, filters=None, order_by=None, limit=None, prepared=True):
+        """
+        Fetch rows matching structured filters. Values are always bound as parameters, and by
+        default the statement is prepared once per connection on the server, so repeated
+        queries of the same shape skip parsing and planning.
+        Args:
+            table_name (str): Name of the table.
+            columns (list, optional): List of columns to retrieve. Defaults to None (all columns).
+            filters (list, optional): (column, operator, value) filters, see build_conditions.
+            order_by (str, optional): Column to sort by, optionally followed by ASC or DESC.
+            limit (int, optional): Number of rows to fetch. Defaults to None.
+            prepared (bool): Use a server-side prepared statement.
+        Returns:
+            list: List of fetched rows.
+        """
+        columns_str = ", ".join(_column(col) for col in columns) if columns else "*"
+        query = f"SELECT {columns_str} FROM {_column(table_name)}"
+        conditions, params = build_conditions(filters)
+        if conditions:
+            query += f" WHERE {conditions}"
+        if order_by:
+            column, _, direction = order_by.partition(" ")
+            if direction.strip().upper() not in ("", "ASC", "DESC"):
+                raise ValueError(f"Invalid sort direction: {direction}")
+            query += f" ORDER BY {_column(column)} {direction.strip().upper()}".rstrip()
+        if limit:
+            query += " LIMIT %s"
+            params.append(int(limit))
+
+        with self._transaction() as cursor:
+            if prepared:
+                self._execute_prepared(cursor, query, params)
+            else:
+                cursor.execute(query, params)
+            rows = cursor.fetchall()
         return rows
 
-    def update_row(self, table_name, updates, conditions):
+    def _execute_prepared(self, cursor, query, params, retry=True):
+        """
+        Run a %s-style query through a named prepared statement on the cursor's connection.
+        Must be the first statement of its transaction: if the server no longer knows the
+        statement, or its result columns changed since it was prepared (e.g. 'SELECT *' after
+        a column was added), the transaction is rolled back and the statement prepared again, once.
+        """
+        name = "stmt_" + hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+        connection = cursor.connection
+        prepared = self._prepared.get(connection)
+        if prepared is None:
+            # New connection, or this handler changed the schema: drop statements planned for the old one
+            cursor.execute("DEALLOCATE ALL")
+            prepared = self._prepared.setdefault(connection, set())
+        if name not in prepared:
+            # Prepared statements outlive failed transactions, so ask the server before preparing
+            cursor.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (name,))
+            if cursor.fetchone() is None:
+                parts = query.split("%s")
+                numbered = parts[0] + "".join(f"${i}{part}" for i, part in enumerate(parts[1:], start=1))
+                cursor.execute(f"PREPARE {name} AS {numbered}")
+            prepared.add(name)
+        try:
+            if params:
+                cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+            else:
+                cursor.execute(f"EXECUTE {name}")
+        except (InvalidSqlStatementName, FeatureNotSupported) as e:
+            if not retry:
+                raise
+            connection.rollback()
+            if isinstance(e, FeatureNotSupported):
+                # "cached plan must not change result type": the table changed under the statement
+                cursor.execute(f"DEALLOCATE {name}")
+            prepared.discard(name)
+            self._execute_prepared(cursor, query, params, retry=False)
+
+    def similarity_search(self, table_name, embedding_column, query_embedding, columns=None,
+                          conditions=None, params=None, top_k=5, ef_search=None, probes=None, filters=None):
+        """
+        Rank rows by cosine distance to the query embedding inside Postgres using pgvector.
+        Args:
+            table_name (str): Name of the table.
+            embedding_column (str): The VECTOR column to search.
+            query_embedding (list): The embedding of the input query.
+            columns (list, optional): List of columns to retrieve. Defaults to None (all columns).
+            conditions (str, optional): SQL WHERE conditions with %s placeholders. Defaults to None.
+            params (tuple, optional): Values bound to the placeholders in conditions.
+            top_k (int): Number of rows to return.
+            ef_search (int, optional): hnsw.ef_search for this query (HNSW indexes).
+            probes (int, optional): ivfflat.probes for this query (IVFFlat indexes).
+            filters (list, optional): Structured filters (see build_conditions), combined with conditions.
+        Returns:
+            list: Up to top_k rows, each with an extra 'similarity' key, most similar first.
+        """
+        columns_str = ", ".join(columns) if columns else "*"
+        vector = self._to_vector_literal(query_embedding)
+
+        query = f"SELECT {columns_str}, 1 - ({embedding_column} <=> %s::vector) AS similarity FROM {table_name}"
+        values = [vector]
+        clauses = [conditions] if conditions else []
+        values.extend(params or ())
+        filter_conditions, filter_params = build_conditions(filters)
+        if filter_conditions:
+            clauses.append(filter_conditions)
+            values.extend(filter_params)
+        if clauses:
+            query += " WHERE " + " AND ".join(f"({clause})" for clause in clauses)
+        query += f" ORDER BY {embedding_column} <=> %s::vector LIMIT %s"
+        values.extend([vector, int(top_k)])
+
+        with self._transaction() as cursor:
+            # SET LOCAL only lasts until this transaction commits
+            if ef_search:
+                cursor.execute("SET LOCAL hnsw.ef_search = %s", (int(ef_search),))
+            if probes:
+                cursor.execute("SET LOCAL ivfflat.probes = %s", (int(probes),))
+            cursor.execute(query, tuple(values))
+            rows = cursor.fetchall()
+        return rows
+
+    def create_vector_index(self, table_name, column, method="hnsw", m=16, ef_construction=64, lists=100):
+        """
+        Create an approximate nearest neighbour index on a pgvector column.
+        Args:
+            table_name (str): Name of the table.
+            column (str): The VECTOR column to index.
+            method (str): 'hnsw' or 'ivfflat'.
+            m (int): HNSW max connections per layer.
+            ef_construction (int): HNSW candidate list size while building.
+            lists (int): Number of IVFFlat lists.
+        """
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        elif method == "ivfflat":
+            options = f"lists = {int(lists)}"
+        else:
+            raise ValueError(f"Unsupported vector index method: {method}")
+
+        index_name = f"{table_name}_{column}_{method}_idx".lower()
+        query = (
+            f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} "
+            f"USING {method} ({column} vector_cosine_ops) WITH ({options});"
+        )
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(query)
+        except Exception as e:
+            raise Exception(f"Error creating {method} index on {table_name}.{column}: {str(e)}")
+
+    def create_index(self, table_name, columns, unique=False, method="btree"):
+        """
+        Create a regular index on one or more columns.
+        Args:
+            table_name (str): Name of the table.
+            columns (list): Indexed columns, in order.
+            unique (bool): Whether the indexed values must be unique.
+            method (str): Index access method, e.g. 'btree' or 'gin'.
+        """
+        suffix = "key" if unique else "idx"
+        index_name = f"{table_name}_{'_'.join(columns)}_{suffix}".lower()
+        query = (
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {table_name} "
+            f"USING {method} ({', '.join(columns)});"
+        )
+        try:
+            with self._transaction() as cursor:
+                cursor.execute(query)
+        except Exception as e:
+            raise Exception(f"Error creating index on {table_name}({', '.join(columns)}): {str(e)}")
+
+    def add_missing_columns(self, table_name, columns):
+        """
+        Add the columns of a table definition that an existing table lacks.
+        Args:
+            table_name (str): Name of the table.
+            columns (dict): Column names and their SQL types.
+        Returns:
+            list: Names of the added columns.
+        """
+        with self._transaction() as cursor:
+            # Unquoted identifiers are stored in lower case
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = lower(%s)", (table_name,))
+            existing = {row['column_name'] for row in cursor.fetchall()}
+            missing = [col for col in columns if col.lower() not in existing]
+            for col in missing:
+                cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {col} {columns[col]}")
+        if missing:
+            # Prepared 'SELECT *' statements would now fail with a changed result type
+            self._prepared.clear()
+        return missing
+
+    @staticmethod
+    def _to_vector_literal(embedding):
+        """Format an embedding as a pgvector text literal."""
+        return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+    def update_row(self, table_name, updates, conditions, params=None):
         """
         Update rows in a table.
         Args:
             table_name (str): Name of the table.
             updates (dict): Column names and their new values.
-            conditions (str): SQL WHERE conditions.
+            conditions (str): SQL WHERE conditions, optionally with %s placeholders.
+            params (tuple, optional): Values bound to the placeholders in conditions.
+        Returns:
+            int: Number of updated rows.
         """
         set_clause = ", ".join([f"{col} = %s" for col in updates.keys()])
-        values = tuple(updates.values())
+        values = tuple(updates.values()) + tuple(params or ())
         query = f"UPDATE {table_name} SET {set_clause} WHERE {conditions}"
-        self.cursor.execute(query, values)
-        self.connection.commit()
+        with self._transaction() as cursor:
+            cursor.execute(query, values)
+            return cursor.rowcount
 
-    def delete_row(self, table_name, conditions):
+    def delete_row(self, table_name, conditions, params=None, returning=None):
         """
         Delete rows from a table.
         Args:
             table_name (str): Name of the table.
-            conditions (str): SQL WHERE conditions.
+            conditions (str): SQL WHERE conditions, optionally with %s placeholders.
+            params (tuple, optional): Values bound to the placeholders in conditions.
+            returning (list, optional): Columns to return for the deleted rows (e.g., ['id']).
+        Returns:
+            int or list: Number of deleted rows, or the deleted rows when returning is set.
         """
         query = f"DELETE FROM {table_name} WHERE {conditions}"
-        self.cursor.execute(query)
-        self.connection.commit()
+        if returning:
+            query += f" RETURNING {', '.join(returning)}"
+        with self._transaction() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall() if returning else cursor.rowcount
 
     def table_exists(self, table_name):
         """
@@ -124,14 +650,17 @@ class DatabaseHandler:
         query = """
         SELECT EXISTS (
             SELECT FROM information_schema.tables
-            WHERE table_name = %s
+            WHERE table_name = lower(%s)
         );
         """
-        self.cursor.execute(query, (table_name,))
-        result = self.cursor.fetchone()
+        with self._transaction() as cursor:
+            cursor.execute(query, (table_name,))
+            result = cursor.fetchone()
         return result['exists']
 
     def close_connection(self):
-        """Close the database connection."""
-        self.cursor.close()
-        self.connection.close()
\ No newline at end of file
+        """Close the database connection, or every connection in the pool."""
+        if self.pooled:
+            self.pool.closeall()
+        else:
+            self.connection.close()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    A content-addressed embedding cache with two tiers:
+    an in-process LRU bounded by bytes, and an SQLite file shared between processes.
+    Entries are keyed by (model name, SHA-256 of the normalized text).
+    """
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, disk_path=None):
+        """
+        Initialize the cache.
+        Args:
+            max_memory_bytes (int): Upper bound on the bytes held by the in-memory tier.
+            disk_path (str, optional): Path of the SQLite file. Defaults to None (memory tier only).
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, timeout=30, check_same_thread=False)
+            # WAL lets several processes read while one writes
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(model_name, text):
+        """
+        Build the cache key for a text embedded with a given model.
+        Whitespace and surrounding spaces are normalized before hashing.
+        """
+        normalized = " ".join(text.split())
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        return f"{model_name}:{digest}"
+
+    def get_many(self, model_name, texts):
+        """
+        Look up embeddings for several texts.
+        Args:
+            model_name (str): The embedding model name.
+            texts (list): The input texts.
+        Returns:
+            list: A float32 array per text, or None where the text is not cached.
+        """
+        keys = [self.make_key(model_name, text) for text in texts]
+        results = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.hits += 1
+                else:
+                    missing.append(i)
+
+            if missing and self._disk is not None:
+                found = self._read_disk([keys[i] for i in missing])
+                still_missing = []
+                for i in missing:
+                    vector = found.get(keys[i])
+                    if vector is None:
+                        still_missing.append(i)
+                        continue
+                    results[i] = vector
+                    self._remember(keys[i], vector)
+                    self.disk_hits += 1
+                missing = still_missing
+
+            self.misses += len(missing)
+        return results
+
+    def get(self, model_name, text):
+        return self.get_many(model_name, [text])[0]
+
+    def put_many(self, model_name, texts, embeddings):
+        """
+        Store embeddings in both tiers.
+        Args:
+            model_name (str): The embedding model name.
+            texts (list): The input texts.
+            embeddings (list): One embedding per text.
+        """
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(model_name, text)
+                vector = np.asarray(embedding, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes()))
+
+            if self._disk is not None and rows:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._disk.commit()
+
+    def put(self, model_name, text, embedding):
+        self.put_many(model_name, [text], [embedding])
+
+    def stats(self):
+        """
+        Returns:
+            dict: Hit and miss counts and the size of the in-memory tier.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+            }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _remember(self, key, vector):
+        """Insert into the LRU tier and evict the least recently used entries over budget."""
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= previous.nbytes
+        if vector.nbytes > self.max_memory_bytes:
+            return
+        self._memory[key] = vector
+        self.memory_bytes += vector.nbytes
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= evicted.nbytes
+
+    def _read_disk(self, keys):
+        found = {}
+        # Stay well below SQLite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            cursor = self._disk.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, blob in cursor:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
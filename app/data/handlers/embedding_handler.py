@@ -1,12 +1,20 @@
 import os
 import json
 import openai
-import tiktoken
+from concurrent.futures import ThreadPoolExecutor
 from sentence_transformers import SentenceTransformer
+from app.data.handlers.embedding_cache import EmbeddingCache
+from app.rag.token_chunking import get_encoding, token_spans
+
+OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+MAX_INPUTS_PER_REQUEST = 2048  # OpenAI limit on inputs per embeddings request
+MAX_TOKENS_PER_REQUEST = 300000  # OpenAI limit on total tokens per embeddings request
+MAX_TOKENS_PER_INPUT = 8191  # Maximum tokens for 'text-embedding-3-small'
 
 def chunk_text(text, max_tokens, encoding_name='cl100k_base'):
     """
     Splits text into chunks that fit within the specified token limit.
+    The text is tokenized once and split on word boundaries.
     Args:
         text (str): The input text to be chunked.
         max_tokens (int): Maximum number of tokens per chunk.
@@ -14,40 +22,32 @@ def chunk_text(text, max_tokens, encoding_name='cl100k_base'):
     Returns:
         list: A list of text chunks.
     """
-    encoding = tiktoken.get_encoding(encoding_name)
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-
-    for word in words:
-        word_tokens = len(encoding.encode(word))
-        if current_tokens + word_tokens > max_tokens:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [word]
-            current_tokens = word_tokens
-        else:
-            current_chunk.append(word)
-            current_tokens += word_tokens
-
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-
-    return chunks
+    spans = token_spans(text, max_tokens, encoding=get_encoding(encoding_name))
+    return [chunk for chunk in (text[start:end].strip() for start, end in spans) if chunk]
 
 class EmbeddingHandler:
-    def __init__(self, model_name='openai', openai_api_key=None):
+    def __init__(self, model_name='openai', openai_api_key=None, max_concurrency=4, batch_size=64, cache_config=None):
         """
         Initialize the embedding handler with the specified model.
         Args:
             model_name (str): The name of the embedding model to use ('openai' or any Sentence-Transformer model).
             openai_api_key (str, optional): OpenAI API key, required if using OpenAI model.
+            max_concurrency (int): Maximum number of embedding requests in flight, shared by all
+                get_embeddings calls on this handler.
+            batch_size (int): Batch size for local Sentence-Transformer encoding.
+            cache_config (dict, optional): Keyword arguments for EmbeddingCache. Defaults to None (no cache).
         """
         self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.encoding = get_encoding('cl100k_base')
+        self.cache = EmbeddingCache(**cache_config) if cache_config else None
         if model_name == 'openai':
             if not openai_api_key:
                 raise ValueError("OpenAI API key must be provided for OpenAI embeddings.")
             openai.api_key = openai_api_key
+            # Long-lived, so a call doesn't pay for starting and stopping threads
+            self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
         else:
             self.model = SentenceTransformer(model_name)
 
@@ -59,12 +59,94 @@ class EmbeddingHandler:
         Returns:
             list: The embedding vector.
         """
+        if self.cache is not None:
+            return self.get_embeddings([text])[0]
+        return self._compute_embedding(text)
+
+    @property
+    def cache_model_name(self):
+        """The model name embeddings are cached under."""
+        return OPENAI_EMBEDDING_MODEL if self.model_name == 'openai' else self.model_name
+
+    def _compute_embedding(self, text):
         if self.model_name == 'openai':
-            response = openai.embeddings.create(input=[text], model="text-embedding-3-small")
+            response = openai.embeddings.create(input=[text], model=OPENAI_EMBEDDING_MODEL)
             return response.data[0].embedding
         else:
             return self.model.encode(text).tolist()
 
+    def get_embeddings(self, texts):
+        """
+        Generate embeddings for many texts with as few requests as possible.
+        Args:
+            texts (list): The input texts to embed.
+        Returns:
+            list: One embedding vector per input text, in input order.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        if self.cache is None:
+            return self._compute_embeddings(texts)
+
+        cached = self.cache.get_many(self.cache_model_name, texts)
+        embeddings = [vector.tolist() if vector is not None else None for vector in cached]
+
+        # Embed each distinct missing text once, even if it repeats in the input
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self._compute_embeddings(missing)))
+            self.cache.put_many(self.cache_model_name, missing, [computed[text] for text in missing])
+            embeddings = [
+                embedding if embedding is not None else computed[text]
+                for text, embedding in zip(texts, embeddings)
+            ]
+        return embeddings
+
+    def _compute_embeddings(self, texts):
+        if self.model_name != 'openai':
+            return self.model.encode(texts, batch_size=self.batch_size).tolist()
+
+        batches = self._pack_batches(texts)
+        if len(batches) == 1:
+            # A single request, e.g. a query, is sent from the calling thread
+            return self._embed_batch(batches[0])[1]
+        embeddings = [None] * len(texts)
+        for start, batch_embeddings in self.executor.map(self._embed_batch, batches):
+            embeddings[start:start + len(batch_embeddings)] = batch_embeddings
+        return embeddings
+
+    def _pack_batches(self, texts):
+        """
+        Split texts into consecutive batches that respect the per-request input and token limits.
+        Returns:
+            list: (start offset, list of texts) tuples.
+        """
+        batches = []
+        start = 0
+        current = []
+        current_tokens = 0
+        for i, text in enumerate(texts):
+            tokens = min(len(self.encoding.encode(text)), MAX_TOKENS_PER_INPUT)
+            if current and (len(current) >= MAX_INPUTS_PER_REQUEST
+                            or current_tokens + tokens > MAX_TOKENS_PER_REQUEST):
+                batches.append((start, current))
+                start = i
+                current = []
+                current_tokens = 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append((start, current))
+        return batches
+
+    def _embed_batch(self, batch):
+        start, texts = batch
+        response = openai.embeddings.create(input=texts, model=OPENAI_EMBEDDING_MODEL)
+        # The API returns one item per input, tagged with its position in the request
+        ordered = sorted(response.data, key=lambda item: item.index)
+        return start, [item.embedding for item in ordered]
+
 def process_document(db_handler, embedding_handler, title, content, metadata=None):
     """
     Process a document by chunking its content, generating embeddings, and storing them in the database.
@@ -75,17 +157,19 @@ def process_document(db_handler, embedding_handler, title, content, metadata=Non
         content (str): The content of the document.
         metadata (dict, optional): Additional metadata for the document.
     """
-    max_tokens = 8191  # Maximum tokens for 'text-embedding-3-small'
+    max_tokens = MAX_TOKENS_PER_INPUT
     chunks = chunk_text(content, max_tokens)
-    for chunk in chunks:
-        embedding = embedding_handler.get_embedding(chunk)
-        data = {
+    embeddings = embedding_handler.get_embeddings(chunks)
+    rows = [
+        {
             'title': title,
             'content': chunk,
             'embedding': embedding,
             'metadata': json.dumps(metadata) if metadata else None
         }
-        db_handler.insert_row('documents', data)
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+    return db_handler.insert_many('documents', rows)
 
 def process_qa_pair(db_handler, embedding_handler, question, answer, metadata=None):
     """
@@ -97,8 +181,7 @@ def process_qa_pair(db_handler, embedding_handler, question, answer, metadata=No
         answer (str): The answer text.
         metadata (dict, optional): Additional metadata for the Q&A pair.
     """
-    question_embedding = embedding_handler.get_embedding(question)
-    answer_embedding = embedding_handler.get_embedding(answer)
+    question_embedding, answer_embedding = embedding_handler.get_embeddings([question, answer])
     data = {
         'question': question,
         'question_embedding': question_embedding,
@@ -106,4 +189,4 @@ def process_qa_pair(db_handler, embedding_handler, question, answer, metadata=No
         'answer_embedding': answer_embedding,
         'metadata': json.dumps(metadata) if metadata else None
     }
-    db_handler.insert_row('qa_pairs', data)
\ No newline at end of file
+    return db_handler.insert_many('qa_pairs', [data])
\ No newline at end of file
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from contextlib import contextmanager
+from app.config.config import get_escalation_config
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; appends are then only serialized within the process
+    fcntl = None
+
+
+class EscalationStore:
+    """
+    An append-only JSON Lines file of escalations. A background writer drains queued
+    records and appends them in batches, each batch in one write under an exclusive file
+    lock, so concurrent threads and processes never lose each other's entries and an
+    escalation costs the same no matter how many are already stored.
+    """
+
+    def __init__(self, path, batch_size=100, flush_interval=0.0):
+        """
+        Args:
+            path (str): The JSON Lines file.
+            batch_size (int): Most records appended in one write.
+            flush_interval (float): Seconds the writer waits for more records before writing.
+                With 0, a batch is whatever queued up while the previous write was syncing.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="escalation-writer", daemon=True)
+        self._writer.start()
+
+    def append(self, record, wait=True):
+        """
+        Queue an escalation for the background writer.
+        Args:
+            record (dict): The escalation; an id and created_at timestamp are added.
+            wait (bool): Block until the record is on disk, raising if it could not be written.
+        Returns:
+            dict: The stored record.
+        """
+        if self._closed:
+            raise RuntimeError("Escalation store is closed")
+        record = self._new_record(record)
+        waiter = {"written": threading.Event(), "error": None} if wait else None
+        self._queue.put((record, waiter))
+        if waiter is not None:
+            waiter["written"].wait()
+            if waiter["error"] is not None:
+                raise waiter["error"]
+        return record
+
+    def import_legacy(self, legacy_path):
+        """
+        Move the entries of the old escalations.json list into the JSON Lines file, once.
+        The entries are appended and the legacy file renamed under the file lock, so processes
+        starting together can't both import it.
+        """
+        with open(self.path, "ab") as f, self._file_lock(f):
+            try:
+                with open(legacy_path) as legacy:
+                    escalations = json.load(legacy)
+            except (OSError, ValueError):
+                return  # Already imported by another process, or unreadable
+            if isinstance(escalations, list):
+                self._append(f, [self._new_record(escalation) for escalation in escalations])
+            os.replace(legacy_path, legacy_path + ".imported")
+
+    def flush(self):
+        """Block until every queued record has been written."""
+        self._queue.join()
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def read(self, cursor=0, limit=50):
+        """
+        Page through escalations in the order they were stored, reading only the requested page.
+        Args:
+            cursor (int): Where to start, as returned by the previous call; 0 for the oldest record.
+            limit (int): Most records to return.
+        Returns:
+            tuple: (list of records, cursor of the next page). The cursor stays put at the end
+                of the file, so polling with it returns new escalations as they arrive.
+        """
+        records = []
+        if not os.path.exists(self.path):
+            return records, cursor
+        with open(self.path, "rb") as f:
+            f.seek(cursor)
+            while len(records) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # End of file, or a record that is still being written
+                cursor += len(line)
+                if line.strip():
+                    records.append(json.loads(line))
+        return records, cursor
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            # Gather whatever else arrives shortly so concurrent escalations share one write
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            error = None
+            try:
+                self._write([record for record, _ in batch])
+            except Exception as e:
+                print(f"Error writing escalations: {e}")
+                error = e
+            finally:
+                for _, waiter in batch:
+                    if waiter is not None:
+                        waiter["error"] = error
+                        waiter["written"].set()
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                return
+
+    @staticmethod
+    def _new_record(record):
+        return {"id": uuid.uuid4().hex, "created_at": time.time(), **record}
+
+    def _write(self, records):
+        with open(self.path, "ab") as f, self._file_lock(f):
+            self._append(f, records)
+
+    @staticmethod
+    def _append(f, records):
+        """Append records to the open, locked file and sync them to disk."""
+        f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+    @contextmanager
+    def _file_lock(self, f):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_escalation_store():
+    """
+    Return the process-wide escalation store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = get_escalation_config()
+            _store = EscalationStore(config["path"], config["batch_size"], config["flush_interval"])
+            if config["legacy_path"] and os.path.exists(config["legacy_path"]):
+                _store.import_legacy(config["legacy_path"])
+        return _store
@@ -0,0 +1,154 @@
+import time
+import threading
+from collections import OrderedDict
+from app.config.config import get_order_store_config
+
+ORDER_COLUMNS = ['status', 'estimated_delivery']
+
+
+class OrderStore:
+    """
+    Looks up orders by order number. Subclasses implement get_many; single lookups go
+    through it so every backend answers a batch in one pass.
+    """
+
+    def get(self, order_number):
+        """
+        Returns:
+            dict: The order's columns, or None when the order does not exist.
+        """
+        order_number = str(order_number)
+        return self.get_many([order_number]).get(order_number)
+
+    def get_many(self, order_numbers):
+        """
+        Args:
+            order_numbers (list): Order numbers to look up.
+        Returns:
+            dict: Order number -> order columns, for the orders that exist.
+        """
+        raise NotImplementedError
+
+
+class FrameOrderStore(OrderStore):
+    """
+    Serves orders from a pandas DataFrame through a hash index on the order number,
+    so a lookup costs O(1) instead of a boolean mask over every row.
+    """
+
+    def __init__(self, frame, key='order_number', columns=ORDER_COLUMNS):
+        index = frame[key].astype(str)
+        if not index.is_unique:
+            raise ValueError(f"Duplicate values in {key}")
+        self.key = key
+        self.columns = columns
+        self._frame = frame[columns].set_axis(index, axis=0)
+
+    def get_many(self, order_numbers):
+        order_numbers = [str(number) for number in order_numbers]
+        positions = self._frame.index.get_indexer(order_numbers)
+        found = positions >= 0
+        if not found.any():
+            return {}
+        rows = self._frame.iloc[positions[found]]
+        return {
+            number: dict(zip(self.columns, values))
+            for number, values in zip(rows.index, rows.itertuples(index=False, name=None))
+        }
+
+
+class PostgresOrderStore(OrderStore):
+    """
+    Serves orders from a Postgres table keyed by order number, fetching a whole batch
+    with one prepared statement on the pooled DatabaseHandler.
+    """
+
+    def __init__(self, db_handler, table_name='orders', key='order_number', columns=ORDER_COLUMNS):
+        self.db_handler = db_handler
+        self.table_name = table_name
+        self.key = key
+        self.columns = columns
+
+    def get_many(self, order_numbers):
+        order_numbers = list({str(number) for number in order_numbers})
+        if not order_numbers:
+            return {}
+        rows = self.db_handler.select(
+            self.table_name, columns=[self.key] + self.columns, filters=[(self.key, 'in', order_numbers)])
+        return {str(row[self.key]): {column: row[column] for column in self.columns} for row in rows}
+
+
+class CachedOrderStore(OrderStore):
+    """
+    Keeps recently looked-up orders for a few seconds in front of another store, so
+    a conversation asking about the same order repeatedly hits the backend once.
+    Misses are cached too, for the same short time.
+    """
+
+    def __init__(self, store, ttl=30, max_size=10000):
+        """
+        Args:
+            store (OrderStore): The backing store.
+            ttl (float): Seconds an entry stays valid.
+            max_size (int): Entries kept before the least recently used ones are dropped.
+        """
+        self.store = store
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # order number -> (expires at, order or None)
+        self._lock = threading.Lock()
+
+    def get_many(self, order_numbers):
+        order_numbers = [str(number) for number in order_numbers]
+        now = time.monotonic()
+        orders = {}
+        missing = []
+        with self._lock:
+            for number in order_numbers:
+                entry = self._entries.get(number)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(number)
+                    if entry[1] is not None:
+                        orders[number] = entry[1]
+                else:
+                    missing.append(number)
+        if not missing:
+            return orders
+
+        fetched = self.store.get_many(missing)
+        orders.update(fetched)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for number in missing:
+                self._entries[number] = (expires, fetched.get(number))
+                self._entries.move_to_end(number)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return orders
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_order_store():
+    """
+    Return the process-wide order store for the configured backend ('frame' or 'postgres').
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            config = get_order_store_config()
+            if config["backend"] == "postgres":
+                # Share the retrieval service's connection pool
+                from app.rag.retrieval_service import get_retrieval_service
+                store = PostgresOrderStore(get_retrieval_service().db_handler, config["table_name"])
+            elif config["backend"] == "frame":
+                from app.data.input.orders import df_orders
+                store = FrameOrderStore(df_orders)
+            else:
+                raise ValueError(f"Unsupported order store backend: {config['backend']}")
+            if config["cache_ttl"] > 0:
+                store = CachedOrderStore(store, config["cache_ttl"], config["cache_size"])
+            _store = store
+        return _store
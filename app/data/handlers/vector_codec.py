@@ -0,0 +1,82 @@
+import numpy as np
+import psycopg2
+import psycopg2.extensions
+
+
+def parse_vector(value, cursor=None):
+    """
+    Parse a pgvector text value ('[0.1,0.2,...]') or a Postgres float array ('{0.1,0.2,...}')
+    into a float32 NumPy array without going through the Python parser.
+    Args:
+        value (str): The text representation sent by Postgres.
+        cursor: Unused, present for the psycopg2 typecaster signature.
+    Returns:
+        np.ndarray: The vector, or None for SQL NULL.
+    """
+    if value is None:
+        return None
+    return np.fromstring(value.strip("[]{}"), dtype=np.float32, sep=",")
+
+
+def decode_embeddings(values, dim=None):
+    """
+    Decode a whole column of embeddings into one preallocated float32 matrix.
+    Args:
+        values (list): Embeddings as NumPy arrays, lists or pgvector text.
+        dim (int, optional): Embedding dimension. Defaults to the size of the first valid value.
+    Returns:
+        tuple: (matrix of shape (len(values), dim), boolean mask of rows that decoded correctly).
+    """
+    valid = np.zeros(len(values), dtype=bool)
+    matrix = None
+
+    for i, value in enumerate(values):
+        if value is None:
+            continue
+        try:
+            if isinstance(value, str):
+                vector = parse_vector(value)
+            else:
+                vector = np.asarray(value, dtype=np.float32)
+            if matrix is None:
+                dim = dim or vector.shape[0]
+                matrix = np.zeros((len(values), dim), dtype=np.float32)
+            matrix[i] = vector
+            valid[i] = True
+        except Exception as e:
+            print(f"Error decoding embedding at row {i}: {str(e)}")
+
+    if matrix is None:
+        matrix = np.zeros((len(values), dim or 0), dtype=np.float32)
+    return matrix, valid
+
+
+def register_vector_codec(connection):
+    """
+    Make embedding columns arrive as float32 NumPy arrays on this connection.
+    Uses pgvector's own adapter when the package is installed, otherwise registers
+    a text typecaster for the vector type. Only the vector type is registered: float
+    arrays can hold NULLs or several dimensions, so they keep psycopg2's list parsing
+    and are converted by decode_embeddings where they are used as embeddings.
+    Args:
+        connection: An open psycopg2 connection.
+    """
+    try:
+        from pgvector.psycopg2 import register_vector
+        register_vector(connection)
+        return
+    except ImportError:
+        pass
+    except psycopg2.ProgrammingError:
+        # The vector extension is not installed in this database
+        connection.rollback()
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT oid FROM pg_type WHERE typname = 'vector'")
+        row = cursor.fetchone()
+    connection.commit()
+    if row is None:
+        return
+    vector_type = psycopg2.extensions.new_type((row[0],), "VECTOR_NUMPY", parse_vector)
+    psycopg2.extensions.register_type(vector_type, connection)
@@ -3,7 +3,7 @@ from .table_manager import TableManager
 from .pdf_processor import PDFProcessor
 from app.data.models.models import MetaData
 
-from tiktoken import get_encoding
+from app.rag.token_chunking import get_encoding
 from app.data.handlers.embedding_handler import EmbeddingHandler
 from app.data.handlers.db_handler import DatabaseHandler
 
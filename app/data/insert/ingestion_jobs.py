@@ -0,0 +1,269 @@
+# ingestion_jobs.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+
+
+class IngestionJobStore:
+    """
+    Durable record of document ingestion jobs in SQLite, shared by every process on the host.
+    A job is claimed with a lease that the worker renews on progress, so jobs from a crashed
+    worker become claimable again once their lease expires.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                    id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    document_title TEXT,
+                    document_metadata TEXT,
+                    agent_id TEXT,
+                    chunk_type TEXT,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    chunks_done INTEGER NOT NULL DEFAULT 0,
+                    chunks_total INTEGER,
+                    pages_done INTEGER NOT NULL DEFAULT 0,
+                    pages_total INTEGER,
+                    timings TEXT NOT NULL DEFAULT '{}',
+                    summary TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    lease_expires REAL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # Job stores created by older versions lack the newer columns
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(ingestion_jobs)")}
+            for column, definition in (("pages_done", "INTEGER NOT NULL DEFAULT 0"),
+                                       ("pages_total", "INTEGER"),
+                                       ("summary", "TEXT")):
+                if column not in columns:
+                    connection.execute(f"ALTER TABLE ingestion_jobs ADD COLUMN {column} {definition}")
+
+    def _connect(self):
+        """One connection per thread; sqlite3 connections can't be shared between threads."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def create(self, file_path, document_title, document_metadata, agent_id, chunk_type):
+        """
+        Record a new queued job.
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO ingestion_jobs (id, file_path, document_title, document_metadata, agent_id,"
+            " chunk_type, status, stage, created_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', 'queued', ?)",
+            (job_id, file_path, document_title, json.dumps(document_metadata), str(agent_id),
+             chunk_type, time.time())
+        )
+        return job_id
+
+    def claim(self, lease_seconds, max_attempts):
+        """
+        Atomically take the oldest queued job, or a running job whose lease expired.
+        Jobs whose worker died during their last allowed attempt are marked failed.
+        Returns:
+            dict: The claimed job, or None when there is nothing to do.
+        """
+        connection = self._connect()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "UPDATE ingestion_jobs SET status = 'failed', stage = 'failed', finished_at = ?,"
+                " error = COALESCE(error, 'The worker stopped during the last attempt') || ' (lease expired after '"
+                " || attempts || ' attempts)'"
+                " WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, now, max_attempts)
+            )
+            row = connection.execute(
+                "SELECT * FROM ingestion_jobs WHERE (status = 'queued' OR (status = 'running' AND lease_expires < ?))"
+                " AND attempts < ? ORDER BY created_at LIMIT 1",
+                (now, max_attempts)
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            connection.execute(
+                "UPDATE ingestion_jobs SET status = 'running', attempts = attempts + 1, lease_expires = ?,"
+                " started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (now + lease_seconds, now, row["id"])
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return self._to_dict(row)
+
+    def update(self, job_id, **fields):
+        for column in ("timings", "summary"):
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        self._connect().execute(
+            f"UPDATE ingestion_jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        row = self._connect().execute("SELECT * FROM ingestion_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job["document_metadata"] = json.loads(job["document_metadata"]) if job["document_metadata"] else None
+        job["timings"] = json.loads(job["timings"]) if job["timings"] else {}
+        job["summary"] = json.loads(job["summary"]) if job["summary"] else None
+        return job
+
+
+class IngestionQueue:
+    """
+    A pool of worker threads that ingest uploaded documents in the background.
+    Progress is committed batch by batch, so a job resumed after a crash skips
+    the chunks that were already stored.
+    """
+
+    def __init__(self, pdf_processor, store, workers=2, lease_seconds=300, poll_interval=2.0, max_attempts=3):
+        """
+        Args:
+            pdf_processor (PDFProcessor): Processor used to ingest each document.
+            store (IngestionJobStore): Durable job records.
+            workers (int): Documents processed in parallel.
+            lease_seconds (float): How long a claimed job may go without progress before another worker may take it over.
+            poll_interval (float): Seconds between checks for jobs submitted by other processes.
+            max_attempts (int): Attempts before a failing job is left as failed.
+        """
+        self.pdf_processor = pdf_processor
+        self.store = store
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """Start the worker threads. Unfinished jobs from earlier runs are picked up automatically."""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ingestion-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, file_path, document_title, document_metadata, agent_id, chunk_type="static"):
+        """
+        Queue a document for ingestion.
+        Returns:
+            str: The job id.
+        """
+        job_id = self.store.create(file_path, document_title, document_metadata, agent_id, chunk_type)
+        self._wake.set()
+        return job_id
+
+    def status(self, job_id):
+        """
+        Returns:
+            dict: Status, stage, chunk and page counts, percent done, per-stage timings and, once completed,
+                the added/kept/removed chunk summary; or None for unknown jobs.
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        total = job["chunks_total"]
+        if job["status"] == "completed":
+            percent = 100.0
+        elif total:
+            percent = round(100.0 * job["chunks_done"] / total, 1)
+        elif job["pages_total"]:
+            # The chunk total is only known at the end, since pages are chunked as they stream in
+            percent = round(100.0 * job["pages_done"] / job["pages_total"], 1)
+        else:
+            percent = 0.0
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "stage": job["stage"],
+            "percent_done": percent,
+            "chunks_done": job["chunks_done"],
+            "chunks_total": total,
+            "pages_done": job["pages_done"],
+            "pages_total": job["pages_total"],
+            "timings": job["timings"],
+            "summary": job["summary"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+
+    def _work(self):
+        while True:
+            try:
+                job = self.store.claim(self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                print(f"Error claiming ingestion job: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job["id"]
+        timings = dict(job["timings"])
+        state = {"stage": None, "since": time.monotonic()}
+
+        def progress(stage, chunks_done, chunks_total, pages_done=None, pages_total=None):
+            now = time.monotonic()
+            if state["stage"] is not None:
+                timings[state["stage"]] = round(timings.get(state["stage"], 0.0) + now - state["since"], 3)
+            state["stage"], state["since"] = stage, now
+            fields = {"stage": stage, "timings": timings, "lease_expires": time.time() + self.lease_seconds}
+            if chunks_done is not None:
+                fields["chunks_done"] = chunks_done
+            if chunks_total is not None:
+                fields["chunks_total"] = chunks_total
+            if pages_done is not None:
+                fields["pages_done"] = pages_done
+            if pages_total is not None:
+                fields["pages_total"] = pages_total
+            self.store.update(job_id, **fields)
+
+        try:
+            summary = self.pdf_processor.process_pdf(
+                job["file_path"],
+                job["document_title"],
+                job["document_metadata"],
+                agent_id=job["agent_id"],
+                chunk_type=job["chunk_type"],
+                start_chunk=job["chunks_done"],
+                progress=progress
+            )
+            self.store.update(job_id, status="completed", summary=summary, finished_at=time.time(), error=None)
+        except Exception as e:
+            traceback.print_exc()
+            # Retried on a later claim until max_attempts is reached
+            if job["attempts"] + 1 >= self.max_attempts:
+                self.store.update(job_id, status="failed", stage="failed", error=str(e),
+                                  timings=timings, finished_at=time.time())
+            else:
+                self.store.update(job_id, status="queued", error=str(e), timings=timings)
@@ -1,73 +1,308 @@
 # pdf_processor.py
+import os
 import json
+import hashlib
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
 from app.rag.chunking import ChunkerFactory
+from app.rag.vector_index import vector_index_cache
+from app.rag.keyword_index import get_keyword_index_store
+from app.config.config import get_vector_index_config
 import PyPDF2
 
+UPLOAD_DOCS_COLUMNS = {
+    "id": "SERIAL PRIMARY KEY",
+    "title": "TEXT",
+    "content": "TEXT",  # Store plain text content
+    "embedding": "VECTOR(1536)",
+    "metadata": "JSONB",  # Metadata should be JSON
+    "chunking_type": "TEXT",
+    "agent_id": "INTEGER",
+    "content_hash": "TEXT",
+    "document_version": "INTEGER"
+}
+
+
+def content_hash(text):
+    """
+    SHA-256 of a chunk's text with whitespace normalized, used to recognize unchanged chunks.
+    """
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
 
 class PDFProcessor:
-    def __init__(self, table_manager, embedding_handler, db_handler, encoding):
+    def __init__(self, table_manager, embedding_handler, db_handler, encoding, extraction_workers=None,
+                 parallel_page_threshold=100, pages_per_task=25):
+        """
+        Args:
+            extraction_workers (int, optional): Processes used to extract text from large PDFs. Defaults to the CPU count.
+            parallel_page_threshold (int): PDFs with fewer pages are extracted in-process.
+            pages_per_task (int): Pages extracted per worker task.
+        """
         self.table_manager = table_manager
         self.embedding_handler = embedding_handler
         self.db_handler = db_handler
         self.encoding = encoding
-    import json
+        self.extraction_workers = extraction_workers
+        self.parallel_page_threshold = parallel_page_threshold
+        self.pages_per_task = pages_per_task
 
-    def process_pdf(self, file_path, document_title, document_metadata, agent_id, chunk_type="static"):
+    def process_pdf(self, file_path, document_title, document_metadata, agent_id, chunk_type="static",
+                    start_chunk=0, batch_size=500, progress=None, mode="diff"):
         """
         Reads a PDF file, extracts its content, and processes it using the specified chunker type.
+        Pages are streamed into the chunker, and chunks are embedded and committed batch by batch,
+        so memory stays bounded by the batch size rather than the document size.
+
+        Every chunk is stored with a content hash, unique per document title, and the version of the document
+        it belongs to. In 'diff' mode, a re-uploaded document (same agent and title) is compared to
+        what is already stored: only new chunks are embedded and inserted, unchanged ones are kept,
+        and chunks that no longer appear in the document are deleted. In 'append' mode nothing is
+        deleted.
+        Args:
+            start_chunk (int): Number of leading chunks already stored by an earlier, interrupted run.
+                Only used in 'append' mode; 'diff' mode recognizes stored chunks by their hash.
+            batch_size (int): Chunks embedded and committed per batch.
+            progress (callable, optional): Called as progress(stage, chunks_done, chunks_total, pages_done, pages_total).
+            mode (str): 'diff' or 'append'.
+        Returns:
+            dict: 'added', 'kept' and 'removed' chunk counts, the 'total' number of chunks in the
+                document and its 'document_version'.
         """
-        document_content = self._extract_text_from_pdf(file_path)
+        if mode not in ("diff", "append"):
+            raise ValueError(f"Unknown ingestion mode: {mode}")
+        report = progress or (lambda stage, chunks_done, chunks_total, pages_done, pages_total: None)
+        pages_total = self._count_pages(file_path)
+        pages_read = [0]
+        if mode == "diff":
+            start_chunk = 0
+
+        def pages():
+            for page_number, page_text in self._iter_pdf_pages(file_path, pages_total):
+                pages_read[0] = page_number
+                yield page_number, page_text
+
+        document = {
+            "title": document_title,
+            "metadata": document_metadata,
+            "agent_id": agent_id,
+            "chunk_type": chunk_type,
+            "mode": mode,
+            "version": None,  # Assigned when the first batch is stored
+        }
+        summary = {"added": 0, "kept": 0, "removed": 0}
+
+        # Initialize the chunker based on the specified type; it is fed page by page
+        chunker = ChunkerFactory.create_chunker(chunk_type, None, encoding=self.encoding)
+
+        report("extracting", start_chunk, None, 0, pages_total)
+        chunk_count = 0
+        batch = []
+        for chunk in chunker.iter_chunks(pages()):
+            chunk_count += 1
+            if chunk_count <= start_chunk:
+                continue  # Stored by an earlier run
+            batch.append(chunk)
+
+            if len(batch) == batch_size:
+                self._embed_and_store(batch, document, summary, chunk_count - len(batch), pages_read[0],
+                                      pages_total, report)
+                batch = []
+        if batch:
+            self._embed_and_store(batch, document, summary, chunk_count - len(batch), pages_read[0],
+                                  pages_total, report)
+
+        if document["version"] is not None:
+            # An IVFFlat index is deferred until the table has data to cluster; a no-op once it exists
+            self.table_manager.create_vector_indexes(
+                "Agent_Upload_Docs", UPLOAD_DOCS_COLUMNS, get_vector_index_config())
+
+        if mode == "diff" and document["version"] is not None:
+            report("cleanup", chunk_count, chunk_count, pages_total, pages_total)
+            summary["removed"] = self._remove_stale_chunks(document)
+
+        report("completed", chunk_count, chunk_count, pages_total, pages_total)
+        return {**summary, "total": chunk_count, "document_version": document["version"]}
+
+    def _embed_and_store(self, batch, document, summary, chunks_done, pages_done, pages_total, report):
+        # Chunks point into the page text; their text is only built here, one batch at a time
+        chunk_texts = [chunk.text for chunk in batch]
+        hashes = [content_hash(chunk_text) for chunk_text in chunk_texts]
+
+        if document["version"] is None:
+            self._create_table(chunk_texts)
+            document["version"] = self._next_document_version(document)
+
+        new = list(range(len(batch)))
+        if document["mode"] == "diff":
+            # Chunks this document already has are kept as they are and just move to the new version
+            stored = self._stored_hashes(document, hashes)
+            self._mark_current(document, [h for h in hashes if h in stored])
+            new = [i for i, h in enumerate(hashes) if h not in stored]
 
+        inserted = 0
+        if new:
+            # Embed the batch in a few batched requests instead of one request per chunk
+            report("embedding", chunks_done, None, pages_done, pages_total)
+            embeddings = self.embedding_handler.get_embeddings([chunk_texts[i] for i in new])
+
+            report("storing", chunks_done, None, pages_done, pages_total)
+            inserted = self._store_chunks(
+                [chunk_texts[i] for i in new], [hashes[i] for i in new], embeddings,
+                [(batch[i].page_start, batch[i].page_end) for i in new], document)
+        summary["added"] += inserted
+        # Repeats of a chunk already stored (e.g. a running header) count as kept
+        summary["kept"] += len(batch) - inserted
+
+        # Time until the next batch is ready is spent extracting and chunking
+        report("extracting", chunks_done + len(batch), None, pages_done, pages_total)
+
+    def _create_table(self, chunk_texts):
         self.table_manager.create_table(
             table_name="Agent_Upload_Docs",
-            columns={
-                "id": "SERIAL PRIMARY KEY",
-                "title": "TEXT",
-                "content": "TEXT",  # Store plain text content
-                "embedding": "VECTOR(1536)",
-                "metadata": "JSONB",  # Metadata should be JSON
-                "chunking_type": "TEXT",
-                "agent_id": "INTEGER"
-            },
-            raw_data=document_content[:1000]
+            columns=UPLOAD_DOCS_COLUMNS,
+            raw_data="\n".join(chunk_texts)[:1000],
+            vector_index=get_vector_index_config(),
+            indexes=[
+                # Per document, so a chunk shared by two titles is stored, versioned and deleted for each
+                {"columns": ["agent_id", "title", "content_hash"], "unique": True},
+                {"columns": ["agent_id", "chunking_type"]}
+            ]
         )
 
-        # Initialize the chunker based on the specified type
-        chunker = ChunkerFactory.create_chunker(chunk_type, document_content)
+    def _next_document_version(self, document):
+        rows = self.db_handler.fetch_data(
+            'Agent_Upload_Docs', columns=['MAX(document_version) AS version'],
+            conditions="agent_id = %s AND title = %s", params=(document["agent_id"], document["title"]))
+        current = rows[0]['version'] if rows else None
+        return (current or 0) + 1
 
-        # Use the chunker to process the document
-        structured_results = chunker.process_document()
+    def _stored_hashes(self, document, hashes):
+        rows = self.db_handler.fetch_data(
+            'Agent_Upload_Docs', columns=['content_hash'],
+            conditions="agent_id = %s AND title = %s AND content_hash = ANY(%s)",
+            params=(document["agent_id"], document["title"], list(set(hashes))))
+        return {row['content_hash'] for row in rows}
 
-        for chunk_group in structured_results:
-            chunk_text = " ".join(chunk_group.sentences)  # Join the list of sentences into a single string of text
+    def _mark_current(self, document, hashes):
+        if not hashes:
+            return
+        self.db_handler.update_row(
+            'Agent_Upload_Docs', {"document_version": document["version"]},
+            "agent_id = %s AND title = %s AND content_hash = ANY(%s)",
+            params=(document["agent_id"], document["title"], list(set(hashes))))
 
-            # Instead of trying to adapt a dict, ensure only text is written to the content column
-            if not isinstance(chunk_text, str):
-                chunk_text = str(chunk_text)  # Convert to string if needed
-
-            embedding = self.embedding_handler.get_embedding(chunk_text)
+    def _remove_stale_chunks(self, document):
+        """
+        Delete the document's chunks that were not part of this version, including rows stored
+        before chunks were hashed.
+        Returns:
+            int: Number of deleted chunks.
+        """
+        agent_id = document["agent_id"]
+        deleted = self.db_handler.delete_row(
+            'Agent_Upload_Docs',
+            "agent_id = %s AND title = %s AND document_version IS DISTINCT FROM %s",
+            params=(agent_id, document["title"], document["version"]),
+            returning=['id'])
+        if deleted:
+            vector_index_cache.invalidate(agent_id=agent_id, document_type='documents')
+            # The keyword index can't drop documents in place, so it is rebuilt on next use
+            get_keyword_index_store().invalidate(agent_id)
+        return len(deleted)
 
-            data = {
-                "title": document_title,
+    def _store_chunks(self, chunk_texts, hashes, embeddings, page_spans, document):
+        """
+        Insert one batch of chunks in a single transaction and update the agent's indexes.
+        Returns:
+            int: Number of inserted chunks.
+        """
+        agent_id = document["agent_id"]
+        document_metadata = document["metadata"]
+        # Each chunk's metadata is the document's metadata plus the pages the chunk came from
+        base_metadata = document_metadata if isinstance(document_metadata, dict) else {"source": document_metadata}
+        rows = [
+            {
+                "title": document["title"],
                 "content": chunk_text,  # This should only be plain text now
                 "embedding": embedding,
-                "metadata": json.dumps(document_metadata),  # Convert metadata dict to JSON string
-                "chunking_type": chunk_type,
-                "agent_id": agent_id
+                "metadata": json.dumps({**base_metadata, "page_start": page_start, "page_end": page_end}),
+                "chunking_type": document["chunk_type"],
+                "agent_id": agent_id,
+                "content_hash": chunk_hash,
+                "document_version": document["version"]
             }
+            for chunk_text, chunk_hash, embedding, (page_start, page_end)
+            in zip(chunk_texts, hashes, embeddings, page_spans)
+        ]
+
+        # Write the batch in one transaction instead of one commit per chunk.
+        # Chunks the document already has are skipped by the (agent_id, title, content_hash) unique index.
+        result = self.db_handler.insert_many(
+            'Agent_Upload_Docs', rows, conflict_column="agent_id, title, content_hash", update_on_conflict=False,
+            returning=['id', 'content'])
 
-            try:
-                self.db_handler.insert_row('Agent_Upload_Docs', data)
-            except Exception as e:
-                print(f"Error inserting row: {str(e)}")
-            
-    def _extract_text_from_pdf(self, file_path):
+        inserted = result["returned"]
+        if inserted:
+            # New rows for this agent make its cached vector index stale
+            vector_index_cache.invalidate(agent_id=agent_id, document_type='documents')
+            # The keyword index is extended in place instead of being rebuilt
+            get_keyword_index_store().add_documents(
+                agent_id, [row['id'] for row in inserted], [row['content'] for row in inserted])
+
+        # insert_many skips pages it could not write; fail the job so it is retried instead of
+        # completing without those chunks (and, in diff mode, deleting their previous version)
+        if result["failed"]:
+            errors = "; ".join(
+                f"rows {failure['start']}-{failure['end']}: {failure['error']}" for failure in result["failed"])
+            raise RuntimeError(f"Failed to store chunks of '{document['title']}': {errors}")
+        return len(inserted)
+
+    def _count_pages(self, file_path):
+        with open(file_path, 'rb') as pdf_file:
+            return len(PyPDF2.PdfReader(pdf_file).pages)
+
+    def _iter_pdf_pages(self, file_path, page_count):
         """
-        Extracts text from a PDF file.
+        Yields (page_number, page_text) pairs in order, starting at page 1.
+        Large PDFs are extracted in a process pool, a few page ranges ahead of the consumer.
         """
-        text = ""
-        with open(file_path, 'rb') as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+        workers = self.extraction_workers or os.cpu_count() or 1
+        if page_count < self.parallel_page_threshold or workers == 1:
+            with open(file_path, 'rb') as pdf_file:
+                reader = PyPDF2.PdfReader(pdf_file)
+                for page_number, page in enumerate(reader.pages, start=1):
+                    yield page_number, page.extract_text() or ""
+            return
+
+        ranges = iter([(start, min(start + self.pages_per_task, page_count))
+                       for start in range(0, page_count, self.pages_per_task)])
+        # Spawn fresh workers: forking this multithreaded process could copy locks held by
+        # other threads (connection pool, SQLite, logging) and deadlock the children.
+        # They re-import the main module, so entry points start their services under __main__
+        # or a startup hook, never on import
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            # Only 2 ranges per worker are in flight, so extracted text can't pile up ahead of chunking
+            pending = deque(
+                (start, executor.submit(_extract_page_range, file_path, start, end))
+                for start, end in islice(ranges, 2 * workers)
+            )
+            while pending:
+                start, future = pending.popleft()
+                page_texts = future.result()
+                next_range = next(ranges, None)
+                if next_range:
+                    pending.append((next_range[0], executor.submit(_extract_page_range, file_path, *next_range)))
+                for offset, page_text in enumerate(page_texts):
+                    yield start + offset + 1, page_text
+
+
+def _extract_page_range(file_path, start, end):
+    """
+    Extracts the text of pages [start, end). Module-level so it can run in a worker process.
+    """
+    with open(file_path, 'rb') as pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        return [reader.pages[index].extract_text() or "" for index in range(start, end)]
@@ -8,7 +8,14 @@ class TableManager:
         self.db_handler = db_handler
         self.client = client
 
-    def create_table(self, table_name, columns, raw_data=None):
+    def create_table(self, table_name, columns, raw_data=None, vector_index=None, indexes=None):
+        """
+        Create the table if needed, or add the columns an older version of it lacks.
+        JSONB columns always get a GIN index so metadata filters can use it.
+        Args:
+            indexes (list, optional): Dicts of DatabaseHandler.create_index arguments, e.g.
+                {"columns": ["agent_id", "content_hash"], "unique": True}.
+        """
         if not self.db_handler.table_exists(table_name):
             self.db_handler.create_table(table_name, columns)
             description = self._generate_table_description(raw_data)
@@ -17,6 +24,46 @@ class TableManager:
                 "table_name": table_name,
                 "description": description
             })
+        else:
+            added = self.db_handler.add_missing_columns(table_name, columns)
+            if added:
+                print(f"Added columns {', '.join(added)} to {table_name}")
+        for index in indexes or []:
+            self.db_handler.create_index(table_name, **index)
+        self._create_jsonb_indexes(table_name, columns)
+        if vector_index:
+            self.create_vector_indexes(table_name, columns, vector_index)
+
+    def _create_jsonb_indexes(self, table_name, columns):
+        """
+        Create a GIN index on every JSONB column of the table.
+        """
+        for column, dtype in columns.items():
+            if dtype.upper() != "JSONB":
+                continue
+            try:
+                self.db_handler.create_index(table_name, [column], method="gin")
+            except Exception as e:
+                print(f"Error creating JSONB index: {e}")
+
+    def create_vector_indexes(self, table_name, columns, vector_index):
+        """
+        Create an HNSW or IVFFlat index on every VECTOR column of the table.
+        IVFFlat clusters the rows present when it is built, so it is not created on an empty
+        table: call this again after the first bulk load. Once the data has grown well beyond
+        what it was built on, an IVFFlat index needs a REINDEX to keep its recall; HNSW does not.
+        """
+        if vector_index.get("method") == "ivfflat" and not self.db_handler.fetch_data(
+                table_name, columns=["1"], limit=1):
+            print(f"Deferring the IVFFlat index on {table_name} until it has rows")
+            return
+        for column, dtype in columns.items():
+            if not dtype.upper().startswith("VECTOR"):
+                continue
+            try:
+                self.db_handler.create_vector_index(table_name, column, **vector_index)
+            except Exception as e:
+                print(f"Error creating vector index: {e}")
 
     def _generate_table_description(self, raw_data):
         if not raw_data:
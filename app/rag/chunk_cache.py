@@ -0,0 +1,62 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from app.config.config import get_agentic_chunking_config
+
+
+class ChunkCache:
+    """
+    Caches the chunks an LLM produced for a batch of sentences, in an SQLite file shared
+    between processes. Entries are keyed by (model, SHA-256 of the batch text), so
+    re-ingesting a document only sends the batches whose sentences changed.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunk_batches (key TEXT PRIMARY KEY, chunks TEXT NOT NULL)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model, batch_text):
+        digest = hashlib.sha256(batch_text.encode("utf-8")).hexdigest()
+        return f"{model}:{digest}"
+
+    def get(self, key):
+        """
+        Returns:
+            list: The cached chunk texts, or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT chunks FROM chunk_batches WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, chunks):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO chunk_batches (key, chunks) VALUES (?, ?)",
+                             (key, json.dumps(chunks)))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_chunk_cache():
+    """Return the process-wide ChunkCache, or None when caching is disabled."""
+    global _cache
+    path = get_agentic_chunking_config()["cache_path"]
+    if not path:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ChunkCache(path)
+        return _cache
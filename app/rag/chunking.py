@@ -1,12 +1,124 @@
+import re
+import time
+import random
+import threading
 import openai
 from pydantic import BaseModel
 from typing import List
+from bisect import bisect_right
 from collections import deque
-from app.data.models.models import ChunkGroups, ChunkGroupSchema, ChunkGroupsDirect, ChunkGroupSchemaDirect
+from concurrent.futures import ThreadPoolExecutor
+from app.data.models.models import ChunkGroupsDirect, ChunkGroupSchemaDirect
+from app.rag.rate_limiter import RateLimiter
+from app.rag.token_chunking import get_encoding, boundary_offsets, token_spans
+from app.rag.chunk_cache import ChunkCache, get_chunk_cache
+from app.config.config import get_agentic_chunking_config
+
+SENTENCE_ENDINGS = re.compile(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
+
+_client = None
+_rate_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_openai_client():
+    """Return the OpenAI client shared by all chunkers, so batches reuse its connection pool."""
+    global _client
+    with _shared_lock:
+        if _client is None:
+            _client = openai.OpenAI()
+        return _client
+
+
+def get_agentic_rate_limiter():
+    """Return the process-wide rate limiter for agentic chunking requests."""
+    global _rate_limiter
+    with _shared_lock:
+        if _rate_limiter is None:
+            config = get_agentic_chunking_config()
+            _rate_limiter = RateLimiter(config["requests_per_minute"], config["tokens_per_minute"])
+        return _rate_limiter
+
+
+def _trim(text, start, end):
+    """Narrow (start, end) to exclude surrounding whitespace without copying the text."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def sentence_spans(text):
+    """
+    Yields the (start, end) offsets of the sentences in text, without surrounding whitespace.
+    """
+    position = 0
+    for match in SENTENCE_ENDINGS.finditer(text):
+        start, end = _trim(text, position, match.start())
+        if start < end:
+            yield start, end
+        position = match.end()
+    start, end = _trim(text, position, len(text))
+    if start < end:
+        yield start, end
+
+
+class Chunk:
+    """
+    A chunk of a document, kept as (source, start, end) pieces pointing into the document text
+    instead of copies of its sentences. The text is only built when it is read, e.g. right
+    before embedding and storing.
+    """
+
+    __slots__ = ("chunk_id", "pieces", "page_start", "page_end")
+
+    def __init__(self, chunk_id, pieces, page_start=None, page_end=None):
+        self.chunk_id = chunk_id
+        self.pieces = pieces
+        self.page_start = page_start
+        self.page_end = page_end
+
+    @classmethod
+    def from_sentences(cls, chunk_id, sentences):
+        """
+        Build a chunk from (source, start, end, page) sentences in document order.
+        Consecutive sentences of the same source become a single piece.
+        """
+        pieces = []
+        pages = []
+        for source, start, end, page in sentences:
+            if pieces and pieces[-1][0] is source and pieces[-1][2] <= start:
+                pieces[-1] = (source, pieces[-1][1], end)
+            else:
+                pieces.append((source, start, end))
+            if page is not None:
+                pages.append(page)
+        return cls(chunk_id, tuple(pieces), min(pages) if pages else None, max(pages) if pages else None)
+
+    @classmethod
+    def from_text(cls, chunk_id, text, page_start=None, page_end=None):
+        """Build a chunk whose text does not come from the document, e.g. an LLM rewrite."""
+        return cls(chunk_id, ((text, 0, len(text)),), page_start, page_end)
+
+    @property
+    def text(self):
+        if len(self.pieces) == 1:
+            source, start, end = self.pieces[0]
+            return source[start:end]
+        return " ".join(source[start:end] for source, start, end in self.pieces)
+
+    def __len__(self):
+        return sum(end - start for _, start, end in self.pieces) + len(self.pieces) - 1
+
+    def __repr__(self):
+        return f"Chunk(chunk_id={self.chunk_id}, length={len(self)}, pages={self.page_start}-{self.page_end})"
+
 
 class BaseChunker:
     """
     A base class for all chunkers.
+    Chunkers group (source, start, end, page) sentences into Chunk objects.
     """
 
     def __init__(self, document_text, max_chunk_size=750, batch_size=50):
@@ -14,33 +126,86 @@ class BaseChunker:
         self.max_chunk_size = max_chunk_size
         self.batch_size = batch_size
         self.sentences = []
-        self.sentence_ids = []
 
     def split_into_sentences(self):
         """
-        Splits the document text into sentences and assigns IDs.
+        Splits the document text into (document_text, start, end, None) sentence spans.
         """
-        import re
-        sentence_endings = re.compile(
-            r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s')
-        self.sentences = [sentence.strip() for sentence in sentence_endings.split(
-            self.document_text) if sentence]
-        self.sentence_ids = list(range(1, len(self.sentences) + 1))
+        text = self.document_text
+        self.sentences = [(text, start, end, None) for start, end in sentence_spans(text)]
         return self.sentences
 
+    def iter_sentences(self, pages):
+        """
+        Splits a stream of (page_number, page_text) pairs into (source, start, end, page_number)
+        sentences without holding more than one page in memory. A sentence that runs over a
+        page break is attributed to the page it starts on.
+        """
+        carry, carry_page = "", None
+        for page_number, page_text in pages:
+            if carry:
+                text, first_page = f"{carry}\n{page_text}", carry_page
+            else:
+                text, first_page = page_text, page_number
+            spans = list(sentence_spans(text))
+            if not spans:
+                continue
+            for position, (start, end) in enumerate(spans[:-1]):
+                yield text, start, end, (first_page if position == 0 else page_number)
+            # The last sentence may continue on the next page
+            carry = text[spans[-1][0]:spans[-1][1]]
+            carry_page = first_page if len(spans) == 1 else page_number
+        if carry:
+            yield carry, 0, len(carry), carry_page
+
+    def iter_chunks(self, pages):
+        """
+        Chunks a stream of (page_number, page_text) pairs incrementally.
+        Yields:
+            Chunk: Chunks in document order.
+        """
+        return self._chunk_sentences(self.iter_sentences(pages))
+
     def process_document(self):
         """
-        Processes the document. To be implemented by subclasses.
+        Processes the whole document text into a list of chunks.
+        """
+        return list(self._chunk_sentences(self.split_into_sentences()))
+
+    def _chunk_sentences(self, sentences):
+        """
+        Groups (source, start, end, page) sentences into chunks. To be implemented by subclasses.
         """
         raise NotImplementedError(
             "This method should be implemented by subclasses.")
 
-    
+
 class AgenticChunker(BaseChunker):
     """
     A class to handle Agentic Chunking with structured outputs from the LLM.
+    Batches are sent concurrently within the shared rate limits, failed batches are retried
+    with exponential backoff, and chunks are returned in document order.
     """
 
+    def __init__(self, document_text, max_chunk_size=750, batch_size=25, client=None, model="gpt-4o-mini",
+                 max_concurrency=4, rate_limiter=None, max_retries=5, cache=None):
+        """
+        Args:
+            client (OpenAI, optional): Client shared by all batches. Defaults to the process-wide client.
+            model (str): Chat model used to group and rewrite sentences.
+            max_concurrency (int): Batches in flight at once.
+            rate_limiter (RateLimiter, optional): Request and token budgets shared with other chunkers.
+            max_retries (int): Retries of a failed batch before chunking fails.
+            cache (ChunkCache, optional): Chunks of already processed batches, keyed by batch content.
+        """
+        super().__init__(document_text, max_chunk_size, batch_size)
+        self.client = client or get_openai_client()
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.cache = cache
+
     def _process_batch(self, sentences):
         combined_sentences = "\n".join(sentences)
         prompt = (
@@ -61,74 +226,101 @@ class AgenticChunker(BaseChunker):
             "Each chunk should be represented as a single JSON object with the 'rewritten' field containing the rewritten text."
         )
 
-        try:
-            client = openai.OpenAI()
-            completion = client.beta.chat.completions.parse(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert text chunker and rewriter."},
-                    {"role": "user", "content": prompt},
-                ],
-                response_format=ChunkGroupsDirect,
-            )
-            return completion.choices[0].message.parsed
-        except Exception as e:
-            print(f"An error occurred while calling the LLM: {e}")
-            return None
+        cache_key = ChunkCache.make_key(self.model, combined_sentences) if self.cache else None
+        if self.cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return ChunkGroupsDirect(chunks=[ChunkGroupSchemaDirect(sentences=text) for text in cached])
 
-    def process_with_llm(self):
-        all_results = []
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                # Rough estimate: about 4 characters per token, and an answer as long as the batch
+                self.rate_limiter.acquire(len(prompt) // 4 + len(combined_sentences) // 4)
+            try:
+                completion = self.client.beta.chat.completions.parse(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are an expert text chunker and rewriter."},
+                        {"role": "user", "content": prompt},
+                    ],
+                    response_format=ChunkGroupsDirect,
+                )
+                result = completion.choices[0].message.parsed
+                if result is None:
+                    raise ValueError("the model returned no parsed chunks")
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise RuntimeError(
+                        f"Agentic chunking failed after {self.max_retries + 1} attempts: {e}") from e
+                delay = min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+                print(f"An error occurred while calling the LLM, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
 
-        for start in range(0, len(self.sentences), self.batch_size):
-            end = start + self.batch_size
-            batch_sentences = self.sentences[start:end]
-            result = self._process_batch(batch_sentences)
-            if result:
-                all_results.extend(result.chunks)
-            else:
-                print(f"No results returned for batch {start + 1}-{end}")
+        if self.cache:
+            self.cache.put(cache_key, [chunk.sentences for chunk in result.chunks])
+        return result
+
+    def _chunk_sentences(self, sentences):
+        # Rewritten chunks can't be traced to single sentences, so they get the pages of their batch.
+        # A bounded window of batches is in flight; results are yielded in submission order.
+        chunk_id = 1
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            pending = deque()
+            for batch, pages in self._iter_batches(sentences):
+                pending.append((executor.submit(self._process_batch, batch), pages))
+                if len(pending) >= 2 * self.max_concurrency:
+                    for chunk in self._completed_chunks(chunk_id, *pending.popleft()):
+                        chunk_id += 1
+                        yield chunk
+            while pending:
+                for chunk in self._completed_chunks(chunk_id, *pending.popleft()):
+                    chunk_id += 1
+                    yield chunk
+
+    def _iter_batches(self, sentences):
+        batch, pages = [], []
+        for source, start, end, page in sentences:
+            batch.append(source[start:end])  # The prompt needs the sentence text
+            if page is not None:
+                pages.append(page)
+            if len(batch) == self.batch_size:
+                yield batch, pages
+                batch, pages = [], []
+        if batch:
+            yield batch, pages
+
+    @staticmethod
+    def _completed_chunks(first_id, future, pages):
+        page_start, page_end = (min(pages), max(pages)) if pages else (None, None)
+        for offset, group in enumerate(future.result().chunks):
+            # Structured output gives each rewritten chunk as one string
+            yield Chunk.from_text(first_id + offset, group.sentences, page_start, page_end)
 
-        return all_results
 
-    def process_document(self):
-        self.split_into_sentences()
-        return self.process_with_llm()
 class StaticChunker(BaseChunker):
     """
     A simple static chunker that splits sentences into fixed-size chunks.
     """
 
-    def process_document(self):
-        self.split_into_sentences()
-        chunks = []
+    def _chunk_sentences(self, sentences):
+        chunk_id = 1
         current_chunk = []
         current_size = 0
 
-        for sentence in self.sentences:  # Use the actual sentence text
-            if current_size + len(sentence) <= self.max_chunk_size:
-                current_chunk.append(sentence)  # Append actual sentence
-                current_size += len(sentence)
-            else:
-                # Append current chunk group with the full sentence text
-                chunks.append(
-                    ChunkGroupSchema(
-                        chunk_id=len(chunks) + 1,
-                        sentences=current_chunk,  # Full sentence list
-                        reason="Static chunking by size"
-                    )
-                )
-                current_chunk = [sentence]  # Start new chunk with the sentence
-                current_size = len(sentence)
+        for sentence in sentences:
+            _, start, end, _ = sentence
+            if current_size + (end - start) > self.max_chunk_size and current_chunk:
+                yield Chunk.from_sentences(chunk_id, current_chunk)
+                chunk_id += 1
+                current_chunk, current_size = [], 0
+            current_chunk.append(sentence)
+            current_size += end - start
 
         if current_chunk:
-            chunks.append(
-                ChunkGroupSchema(
-                    chunk_id=len(chunks) + 1,
-                    sentences=current_chunk,
-                    reason="Static chunking by size"
-                )
-            )
-        return chunks
+            yield Chunk.from_sentences(chunk_id, current_chunk)
+
+
 class OverlapChunker(BaseChunker):
     """
     An Overlap chunker for hierarchical chunking logic with overlapping chunks.
@@ -138,52 +330,96 @@ class OverlapChunker(BaseChunker):
         super().__init__(document_text, max_chunk_size, batch_size)
         self.overlap_size = overlap_size
 
-    def process_document(self):
+    def _chunk_sentences(self, sentences):
         """
-        Process the document into overlapping chunks.
+        Group sentences into chunks of max_chunk_size sentences, each sharing overlap_size
+        sentences with the previous one.
         """
-        self.split_into_sentences()
-
-        chunks = []
         queue = deque(maxlen=self.max_chunk_size)
         chunk_id = 1
+        added = 0  # Sentences queued since the last chunk was emitted
 
-        # Iterator over sentences and their IDs
-        sentence_iterator = iter(zip(self.sentence_ids, self.sentences))
-
-        try:
-            # Pre-fill the queue with the first chunk
-            for _ in range(self.max_chunk_size):
-                sentence_id, sentence = next(sentence_iterator)
-                queue.append(sentence_id)
-
-            while True:
-                # Append current chunk to the result
-                chunks.append(
-                    ChunkGroupSchema(
-                        chunk_id=chunk_id,
-                        sentences=list(queue),
-                        reason="Overlap chunking",
-                    )
-                )
+        for sentence in sentences:
+            queue.append(sentence)
+            added += 1
+            # The first chunk needs a full queue, later ones max_chunk_size - overlap_size new sentences
+            needed = self.max_chunk_size if chunk_id == 1 else self.max_chunk_size - self.overlap_size
+            if added >= needed:
+                yield Chunk.from_sentences(chunk_id, queue)
                 chunk_id += 1
+                added = 0
 
-                # Add new sentences to the queue for the next chunk
-                for _ in range(self.max_chunk_size - self.overlap_size):
-                    sentence_id, sentence = next(sentence_iterator)
-                    queue.append(sentence_id)
-        except StopIteration:
-            # Handle any remaining elements in the queue
-            if queue:
-                chunks.append(
-                    ChunkGroupSchema(
-                        chunk_id=chunk_id,
-                        sentences=list(queue),
-                        reason="Overlap chunking",
-                    )
-                )
+        # Handle any remaining sentences that are not in a chunk yet
+        if added:
+            yield Chunk.from_sentences(chunk_id, queue)
+
+
+class TokenChunker(BaseChunker):
+    """
+    Splits text into chunks of at most max_chunk_size tokens that end on sentence boundaries,
+    with up to overlap_tokens tokens of whole sentences repeated between consecutive chunks.
+    Text is tokenized once, in windows of pages when it is streamed.
+    """
+
+    def __init__(self, document_text, max_chunk_size=256, overlap_tokens=32, encoding=None,
+                 window_chars=200000):
+        """
+        Args:
+            max_chunk_size (int): Maximum tokens per chunk.
+            overlap_tokens (int): Tokens shared by consecutive chunks.
+            encoding (tiktoken.Encoding, optional): Tokenizer. Defaults to the cached cl100k_base encoding.
+            window_chars (int): Characters of streamed pages tokenized at a time.
+        """
+        super().__init__(document_text, max_chunk_size)
+        self.overlap_tokens = overlap_tokens
+        self.encoding = encoding or get_encoding()
+        self.window_chars = window_chars
+
+    def process_document(self):
+        return list(self.iter_chunks([(None, self.document_text)]))
+
+    def iter_chunks(self, pages):
+        buffer = ""
+        page_starts = []  # (offset in buffer, page number) of every page in the buffer
+        chunk_id = 1
+        for page_number, page_text in pages:
+            if buffer:
+                buffer += "\n"
+            page_starts.append((len(buffer), page_number))
+            buffer += page_text
+            if len(buffer) < self.window_chars:
+                continue
+            # The last span may continue in the next pages, so it is chunked with the next window
+            spans = self._spans(buffer)
+            for start, end in spans[:-1]:
+                chunk = self._chunk(chunk_id, buffer, start, end, page_starts)
+                if chunk:
+                    yield chunk
+                    chunk_id += 1
+            if len(spans) > 1:
+                consumed = spans[-1][0]
+                buffer = buffer[consumed:]
+                first = max(i for i, (offset, _) in enumerate(page_starts) if offset <= consumed)
+                page_starts = [(max(offset - consumed, 0), page) for offset, page in page_starts[first:]]
 
-        return chunks
+        for start, end in self._spans(buffer):
+            chunk = self._chunk(chunk_id, buffer, start, end, page_starts)
+            if chunk:
+                yield chunk
+                chunk_id += 1
+
+    def _spans(self, text):
+        return token_spans(text, self.max_chunk_size, self.overlap_tokens, self.encoding,
+                           boundaries=boundary_offsets(text, SENTENCE_ENDINGS))
+
+    def _chunk(self, chunk_id, text, start, end, page_starts):
+        start, end = _trim(text, start, end)
+        if start == end:
+            return None
+        offsets = [offset for offset, _ in page_starts]
+        first_page = page_starts[bisect_right(offsets, start) - 1][1]
+        last_page = page_starts[bisect_right(offsets, end - 1) - 1][1]
+        return Chunk(chunk_id, ((text, start, end),), first_page, last_page)
 
 
 class ChunkerFactory:
@@ -191,12 +427,24 @@ class ChunkerFactory:
     A factory class to create different types of chunkers.
     """
     @staticmethod
-    def create_chunker(chunker_type, document_text, max_chunk_size=750, batch_size=50):
+    def create_chunker(chunker_type, document_text, max_chunk_size=750, batch_size=50, encoding=None):
         if chunker_type == "agentic":
-            return AgenticChunker(document_text, max_chunk_size, batch_size=25)
+            config = get_agentic_chunking_config()
+            return AgenticChunker(
+                document_text,
+                max_chunk_size,
+                batch_size=25,
+                model=config["model"],
+                max_concurrency=config["max_concurrency"],
+                rate_limiter=get_agentic_rate_limiter(),
+                max_retries=config["max_retries"],
+                cache=get_chunk_cache()
+            )
         elif chunker_type == "static":
             return StaticChunker(document_text, max_chunk_size, batch_size)
         elif chunker_type == "overlap":
             return OverlapChunker(document_text, max_chunk_size=5, batch_size=10)
+        elif chunker_type == "token":
+            return TokenChunker(document_text, max_chunk_size=256, overlap_tokens=32, encoding=encoding)
         else:
             raise ValueError(f"Unknown chunker type: {chunker_type}")
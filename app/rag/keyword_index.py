@@ -0,0 +1,242 @@
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+import numpy as np
+from app.config.config import get_keyword_index_config
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercase a text and split it into word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class KeywordIndex:
+    """
+    A BM25 inverted index. Every term keeps a postings list of (document position, term frequency)
+    in compact arrays, and document lengths and IDF are kept as NumPy arrays, so a query only
+    touches the postings of its own terms.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        self.postings_docs = []
+        self.postings_freqs = []
+        self.doc_ids = []
+        self.doc_lengths = array('i')
+        self._idf = None
+        self._lengths = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def add_documents(self, doc_ids, texts):
+        """
+        Add documents to the index.
+
+        Args:
+            doc_ids (list): Database ids of the documents.
+            texts (list): The document texts.
+        """
+        tokenized = [Counter(tokenize(text)) for text in texts]
+        with self._lock:
+            for doc_id, counts in zip(doc_ids, tokenized):
+                position = len(self.doc_ids)
+                for term, frequency in counts.items():
+                    term_id = self.vocabulary.get(term)
+                    if term_id is None:
+                        term_id = len(self.postings_docs)
+                        self.vocabulary[term] = term_id
+                        self.postings_docs.append(array('i'))
+                        self.postings_freqs.append(array('f'))
+                    self.postings_docs[term_id].append(position)
+                    self.postings_freqs[term_id].append(frequency)
+                self.doc_ids.append(doc_id)
+                self.doc_lengths.append(sum(counts.values()))
+            # IDF and lengths are recomputed lazily on the next search
+            self._idf = None
+
+    def _prepare(self):
+        if self._idf is not None:
+            return
+        total = len(self.doc_ids)
+        frequencies = np.array([len(docs) for docs in self.postings_docs], dtype=np.float32)
+        self._idf = np.log1p((total - frequencies + 0.5) / (frequencies + 0.5))
+        self._lengths = np.array(self.doc_lengths, dtype=np.float32)
+        self._average_length = float(self._lengths.mean()) if total else 0.0
+
+    def search(self, query, top_k=6):
+        """
+        Score documents against a query with BM25.
+
+        Args:
+            query (str): The input query.
+            top_k (int): Number of top results to return.
+
+        Returns:
+            list: (doc_id, score) tuples sorted by score in descending order.
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self.doc_ids or top_k <= 0:
+                return []
+            self._prepare()
+
+            scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+            length_norm = self.k1 * (1 - self.b + self.b * self._lengths / (self._average_length or 1.0))
+            for term in terms:
+                term_id = self.vocabulary.get(term)
+                if term_id is None:
+                    continue
+                docs = np.array(self.postings_docs[term_id], dtype=np.int32)
+                freqs = np.array(self.postings_freqs[term_id], dtype=np.float32)
+                scores[docs] += self._idf[term_id] * freqs * (self.k1 + 1) / (freqs + length_norm[docs])
+            doc_ids = self.doc_ids
+
+        matches = np.flatnonzero(scores)
+        if len(matches) > top_k:
+            matches = matches[np.argpartition(-scores[matches], top_k - 1)[:top_k]]
+        order = matches[np.argsort(-scores[matches], kind='stable')]
+        return [(doc_ids[i], float(scores[i])) for i in order]
+
+    def save(self, f):
+        """
+        Write the index to a binary file as plain NumPy arrays, so loading it runs no pickle code.
+        """
+        with self._lock:
+            terms = [None] * len(self.vocabulary)
+            for term, term_id in self.vocabulary.items():
+                terms[term_id] = term
+            docs = array('i')
+            freqs = array('f')
+            for term_docs, term_freqs in zip(self.postings_docs, self.postings_freqs):
+                docs.extend(term_docs)
+                freqs.extend(term_freqs)
+            np.savez(
+                f,
+                parameters=np.array([self.k1, self.b], dtype=np.float64),
+                terms=np.array(terms, dtype=str),
+                offsets=np.cumsum([0] + [len(term_docs) for term_docs in self.postings_docs], dtype=np.int64),
+                docs=np.frombuffer(docs, dtype=np.int32),
+                freqs=np.frombuffer(freqs, dtype=np.float32),
+                doc_ids=np.array(self.doc_ids, dtype=np.int64),
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.int32),
+            )
+
+    @classmethod
+    def load(cls, f):
+        """
+        Read an index written by save.
+        """
+        data = np.load(f, allow_pickle=False)
+        k1, b = data["parameters"].tolist()
+        index = cls(k1, b)
+        index.vocabulary = {term: term_id for term_id, term in enumerate(data["terms"].tolist())}
+        docs = data["docs"]
+        freqs = data["freqs"]
+        offsets = data["offsets"].tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            index.postings_docs.append(array('i', docs[start:end].tobytes()))
+            index.postings_freqs.append(array('f', freqs[start:end].tobytes()))
+        index.doc_ids = data["doc_ids"].tolist()
+        index.doc_lengths = array('i', data["doc_lengths"].tobytes())
+        return index
+
+
+class KeywordIndexStore:
+    """
+    Keeps one KeywordIndex per agent in memory and persists it to disk,
+    reloading when another process (e.g. an ingestion script) updated the file.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._indexes = {}
+        self._lock = threading.Lock()
+        os.makedirs(index_dir, exist_ok=True)
+
+    def _path(self, agent_id):
+        # Agent ids come from requests; int() keeps anything else out of the file name
+        return os.path.join(self.index_dir, f"agent_{int(agent_id)}.npz")
+
+    def get(self, agent_id, loader):
+        """
+        Return the index for an agent, loading it from disk or building it with loader().
+
+        Args:
+            agent_id (int): The agent whose documents are indexed.
+            loader (callable): Returns (doc_ids, texts) for every document of the agent.
+
+        Returns:
+            KeywordIndex: The agent's index.
+        """
+        path = self._path(agent_id)
+        with self._lock:
+            cached = self._indexes.get(str(agent_id))
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if cached is not None and (mtime is None or cached[1] >= mtime):
+                return cached[0]
+
+            if mtime is not None:
+                with open(path, 'rb') as f:
+                    index = KeywordIndex.load(f)
+            else:
+                index = KeywordIndex()
+                doc_ids, texts = loader()
+                index.add_documents(doc_ids, texts)
+                mtime = self._save(agent_id, index)
+            self._indexes[str(agent_id)] = (index, mtime)
+            return index
+
+    def add_documents(self, agent_id, doc_ids, texts):
+        """
+        Add newly ingested documents to an agent's index and persist it.
+        Agents without an index yet are skipped; theirs is built from the database on first use.
+        """
+        path = self._path(agent_id)
+        with self._lock:
+            cached = self._indexes.get(str(agent_id))
+            if cached is not None:
+                index = cached[0]
+            elif os.path.exists(path):
+                with open(path, 'rb') as f:
+                    index = KeywordIndex.load(f)
+            else:
+                return
+            index.add_documents(doc_ids, texts)
+            self._indexes[str(agent_id)] = (index, self._save(agent_id, index))
+
+    def invalidate(self, agent_id):
+        """Delete an agent's index so it is rebuilt from the database on next use."""
+        with self._lock:
+            self._indexes.pop(str(agent_id), None)
+            if os.path.exists(self._path(agent_id)):
+                os.remove(self._path(agent_id))
+
+    def _save(self, agent_id, index):
+        path = self._path(agent_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            index.save(f)
+        # Atomic replace so readers never see a half-written file
+        os.replace(temp_path, path)
+        return os.path.getmtime(path)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_keyword_index_store():
+    """Return the process-wide KeywordIndexStore."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = KeywordIndexStore(**get_keyword_index_config())
+        return _store
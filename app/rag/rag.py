@@ -1,45 +1,140 @@
-import os
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from rank_bm25 import BM25Okapi
+import json
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import cohere
+from app.rag.vector_index import VectorIndex, vector_index_cache
+from app.rag.keyword_index import get_keyword_index_store
+from app.rag.rerankers import RerankerFactory
 # Load environment variables
 load_dotenv()
 
 
 class RAGPipeline:
-    def __init__(self, db_handler, embedding_handler):
+    def __init__(self, db_handler, embedding_handler, search_mode='memory', ef_search=None, probes=None,
+                 reranker_config=None, load_batch_size=2000):
         """
-        Initialize the RAG pipeline with database, embedding handlers, and Cohere client.
+        Initialize the RAG pipeline with database and embedding handlers.
 
         Args:
             db_handler (DatabaseHandler): Instance for database interactions.
             embedding_handler (EmbeddingHandler): Instance for embedding generation.
-            cohere_api_key (str): API key for Cohere's services.
+            search_mode (str): 'memory' to rank in the cached vector index, 'database' to rank in Postgres.
+            ef_search (int, optional): hnsw.ef_search used in 'database' mode.
+            probes (int, optional): ivfflat.probes used in 'database' mode.
+            reranker_config (dict, optional): Default reranker type, per-agent overrides and
+                per-type options (see get_reranker_config). Defaults to Cohere for every agent.
+            load_batch_size (int): Rows streamed per round trip when building an in-memory index.
         """
+        if search_mode not in ('memory', 'database'):
+            raise ValueError(f"Unsupported search mode: {search_mode}")
         self.db_handler = db_handler
         self.embedding_handler = embedding_handler
-        self.cohere_client = cohere.Client(api_key=os.getenv("COHERE_API_KEY"))
-        self.bm25 = None
-        self.tokenized_documents = []
+        self.search_mode = search_mode
+        self.ef_search = ef_search
+        self.probes = probes
+        self.load_batch_size = load_batch_size
+        self.reranker_config = reranker_config or {"default": "cohere", "agents": {}, "options": {}}
+        self.rerankers = {}  # Created lazily, one per reranker type
+        self.keyword_index_store = get_keyword_index_store()
+        # Runs the similarity and keyword halves of a hybrid query side by side
+        self.executor = ThreadPoolExecutor(max_workers=4)
 
-    def fetch_data(self, document_type, chunking_type, agent_id):
+    @staticmethod
+    def document_filters(agent_id, chunking_type=None, metadata_filter=None):
+        """
+        Build the structured filters selecting an agent's document chunks.
+
+        Args:
+            agent_id (int): The agent whose documents are selected.
+            chunking_type (str, optional): Only chunks produced by this chunker.
+            metadata_filter (dict, optional): Required values of metadata keys, e.g. {"source": "faq.pdf"}.
+
+        Returns:
+            list: Filters for DatabaseHandler.select and similarity_search.
+        """
+        filters = [('agent_id', '=', agent_id)]
+        if chunking_type:
+            filters.append(('chunking_type', '=', chunking_type))
+        if metadata_filter:
+            # A single containment test, which the GIN index on metadata can answer
+            filters.append(('metadata', '@>', metadata_filter))
+        return filters
+
+    def fetch_data(self, document_type, chunking_type, agent_id, metadata_filter=None):
         """
         Fetch data from the database based on the document type.
 
         Args:
             document_type (str): The type of document to retrieve ('documents' or 'qa_pairs').
-            chunking_type (str): The type of chunking applied.
+            chunking_type (str): The type of chunking applied, or None for every type.
+            agent_id (int): The agent whose documents are fetched.
+            metadata_filter (dict, optional): Required values of metadata keys.
 
         Returns:
             list: The retrieved data from the database.
         """
         if document_type == 'documents':
-            conditions = f"agent_id = '{agent_id}'"            
-            return self.db_handler.fetch_data('agent_upload_docs', columns=['content', 'embedding', 'chunking_type'], conditions=conditions)
+            return self.db_handler.select(
+                'agent_upload_docs', columns=['id', 'content', 'embedding', 'chunking_type'],
+                filters=self.document_filters(agent_id, chunking_type, metadata_filter))
+        elif document_type == 'qa_pairs':
+            return self.db_handler.select('qa_pairs', columns=['question', 'answer', 'question_embedding'])
+        else:
+            raise ValueError(f"Unsupported document type: {document_type}")
+
+    def iter_data(self, document_type, chunking_type, agent_id, metadata_filter=None):
+        """
+        Stream the data fetch_data returns in column-oriented batches with the embeddings
+        decoded into float32 matrices, holding one batch in memory at a time.
+
+        Returns:
+            iterator: Batches as yielded by DatabaseHandler.iter_batches.
+        """
+        if document_type == 'documents':
+            return self.db_handler.iter_batches(
+                'agent_upload_docs', columns=['id', 'content', 'embedding'],
+                filters=self.document_filters(agent_id, chunking_type, metadata_filter),
+                batch_size=self.load_batch_size, embedding_column='embedding')
+        elif document_type == 'qa_pairs':
+            return self.db_handler.iter_batches(
+                'qa_pairs', columns=['question', 'answer', 'question_embedding'],
+                batch_size=self.load_batch_size, embedding_column='question_embedding')
+        else:
+            raise ValueError(f"Unsupported document type: {document_type}")
+
+    def search_database(self, input_embedding, document_type, agent_id, top_k=6, chunking_type=None,
+                        metadata_filter=None):
+        """
+        Let Postgres rank the rows with pgvector so only the top-k rows are transferred.
+
+        Args:
+            input_embedding (array): The embedding of the input query.
+            document_type (str): The type of document to search in ('documents' or 'qa_pairs').
+            agent_id (int): The agent whose documents are searched.
+            top_k (int): Number of top results to return.
+            chunking_type (str, optional): Only search chunks produced by this chunker.
+            metadata_filter (dict, optional): Required values of metadata keys.
+
+        Returns:
+            list: Top-k similarities sorted in descending order.
+        """
+        if document_type == 'documents':
+            rows = self.db_handler.similarity_search(
+                'agent_upload_docs', 'embedding', input_embedding,
+                columns=['id', 'content'], filters=self.document_filters(agent_id, chunking_type, metadata_filter),
+                top_k=top_k, ef_search=self.ef_search, probes=self.probes)
+            return [
+                {'id': row['id'], 'question': None, 'answer': row['content'], 'similarity': float(row['similarity'])}
+                for row in rows
+            ]
         elif document_type == 'qa_pairs':
-            return self.db_handler.fetch_data('qa_pairs', columns=['question', 'answer', 'question_embedding'])
+            rows = self.db_handler.similarity_search(
+                'qa_pairs', 'question_embedding', input_embedding,
+                columns=['question', 'answer'], top_k=top_k,
+                ef_search=self.ef_search, probes=self.probes)
+            return [
+                {'id': None, 'question': row['question'], 'answer': row['answer'], 'similarity': float(row['similarity'])}
+                for row in rows
+            ]
         else:
             raise ValueError(f"Unsupported document type: {document_type}")
 
@@ -56,46 +151,64 @@ class RAGPipeline:
         Returns:
             list: Top-k similarities sorted in descending order.
         """
-        similarities = []
-
-        for record in stored_data:
-            try:
-                if is_qa_pairs:
-                    stored_question = record['question']
-                    stored_answer = record['answer']
-                    stored_embedding = np.array(
-                        eval(record['question_embedding']))
-                else:
-                    stored_question = None
-                    stored_answer = record['content']
-                    stored_embedding = np.array(eval(record['embedding']))
-
-                similarity = cosine_similarity(
-                    np.array(input_embedding).reshape(1, -1),
-                    stored_embedding.reshape(1, -1)
-                )[0][0]
-
-                similarities.append({
-                    'question': stored_question,
-                    'answer': stored_answer,
-                    'similarity': similarity
-                })
-            except Exception as e:
-                print(f"Error processing record: {record}, Error: {str(e)}")
-
-        # Sort by similarity and return only top_k results
-        sorted_results = sorted(
-            similarities, key=lambda x: x['similarity'], reverse=True)
-        return sorted_results[:top_k]
-
-    def rerank_results(self, query, combined_results, top_k):
-        """
-        Re-rank the combined results using the Cohere re-ranking API.
+        index = self._build_index(stored_data, is_qa_pairs)
+        return index.search(input_embedding, top_k)
+
+    def _build_index(self, stored_data, is_qa_pairs):
+        """
+        Build a VectorIndex from rows returned by fetch_data.
+        """
+        if is_qa_pairs:
+            return VectorIndex.from_records(
+                stored_data, 'question_embedding', 'answer', question_column='question')
+        return VectorIndex.from_records(stored_data, 'embedding', 'content', id_column='id')
+
+    def get_index(self, document_type, agent_id, chunking_type=None, metadata_filter=None):
+        """
+        Return the cached vector index for an agent, loading it from the database on first use.
+
+        Args:
+            document_type (str): The type of document to search in ('documents' or 'qa_pairs').
+            agent_id (int): The agent whose data is indexed.
+            chunking_type (str, optional): Only index chunks produced by this chunker.
+            metadata_filter (dict, optional): Only index chunks with these metadata values.
+
+        Returns:
+            VectorIndex: The index for this agent, document type and filter.
+        """
+        def load():
+            # Stream the corpus so a large agent is never held as one list of row dicts
+            batches = self.iter_data(document_type, chunking_type, agent_id, metadata_filter)
+            if document_type == 'qa_pairs':
+                return VectorIndex.from_batches(batches, 'question_embedding', 'answer', question_column='question')
+            return VectorIndex.from_batches(batches, 'embedding', 'content', id_column='id')
+
+        # Each filtered slice gets its own index; invalidating an agent drops all of them
+        filter_key = (chunking_type, json.dumps(metadata_filter, sort_keys=True) if metadata_filter else None)
+        return vector_index_cache.get((document_type, agent_id, filter_key), load)
+
+    def get_reranker(self, agent_id=None):
+        """
+        Return the reranker configured for an agent, falling back to the default type.
+        """
+        agents = self.reranker_config.get("agents", {})
+        reranker_type = agents.get(str(agent_id), self.reranker_config.get("default", "cohere"))
+        reranker = self.rerankers.get(reranker_type)
+        if reranker is None:
+            options = self.reranker_config.get("options", {}).get(reranker_type, {})
+            reranker = RerankerFactory.create_reranker(reranker_type, **options)
+            reranker = self.rerankers.setdefault(reranker_type, reranker)
+        return reranker
+
+    def rerank_results(self, query, combined_results, top_k, agent_id=None):
+        """
+        Re-rank the combined results with the reranker configured for the agent.
 
         Args:
             query (str): The input query.
             combined_results (list): Combined results from similarity and keyword searches.
             top_k (int): Number of top results to return.
+            agent_id (int, optional): The agent whose reranker should be used.
 
         Returns:
             list: Re-ranked results with their original metadata and updated similarity scores.
@@ -108,32 +221,107 @@ class RAGPipeline:
                 unique_results.append(result)
                 seen_texts.add(result['answer'])
 
-        # Prepare data for Cohere re-ranking
         documents = [result['answer'] for result in unique_results]
-
-        # Call Cohere re-rank API
-        rerank_results = self.cohere_client.rerank(
-            query=query,
-            documents=documents,
-            top_n=top_k,
-            model="rerank-english-v2.0"
-        )
+        ranking = self.get_reranker(agent_id).rerank(query, documents, top_k)
 
         # Map re-ranked results back to original data and update similarity scores
         reranked_combined_results = [
             {
-                'question': unique_results[doc.index]['question'],
-                'answer': unique_results[doc.index]['answer'],
-                'similarity': doc.relevance_score,  # Use relevance_score as the similarity score
-                'source': unique_results[doc.index]['source'],
+                'question': unique_results[index]['question'],
+                'answer': unique_results[index]['answer'],
+                'similarity': score,  # Use the relevance score as the similarity score
+                'source': unique_results[index].get('source'),
                 'rank': idx + 1  # Rank based on the re-rank order
             }
-            for idx, doc in enumerate(rerank_results.results)
+            for idx, (index, score) in enumerate(ranking)
         ]
         return reranked_combined_results[:top_k]
 
+    def keyword_search(self, query, agent_id, top_k=6, chunking_type=None, metadata_filter=None):
+        """
+        Rank an agent's document chunks with BM25 using its persisted inverted index.
+
+        Args:
+            query (str): The input query.
+            agent_id (int): The agent whose documents are searched.
+            top_k (int): Number of top results to return.
+            chunking_type (str, optional): Only return chunks produced by this chunker.
+            metadata_filter (dict, optional): Only return chunks with these metadata values.
+
+        Returns:
+            list: Top-k results sorted by BM25 score in descending order.
+        """
+        def load():
+            ids, contents = [], []
+            for batch in self.db_handler.iter_batches(
+                    'agent_upload_docs', columns=['id', 'content'], filters=[('agent_id', '=', agent_id)],
+                    batch_size=self.load_batch_size):
+                ids.extend(batch['id'])
+                contents.extend(batch['content'])
+            return ids, contents
+
+        index = self.keyword_index_store.get(agent_id, load)
+        # The index covers all of the agent's chunks, so over-fetch when filters will drop some
+        filtered = bool(chunking_type or metadata_filter)
+        matches = index.search(query, top_k * 5 if filtered else top_k)
+        if not matches:
+            return []
+
+        # Only the matched chunks are read back from the database, with the filters applied
+        filters = self.document_filters(agent_id, chunking_type, metadata_filter)
+        filters.append(('id', 'in', [int(doc_id) for doc_id, _ in matches]))
+        rows = self.db_handler.select('agent_upload_docs', columns=['id', 'content'], filters=filters)
+        contents = {row['id']: row['content'] for row in rows}
+        return [
+            {'id': doc_id, 'question': None, 'answer': contents[doc_id], 'similarity': score, 'source': 'keyword'}
+            for doc_id, score in matches
+            if doc_id in contents
+        ][:top_k]
+
+    def similarity_search(self, query, agent_id, document_type='documents', top_k=6, chunking_type=None,
+                          metadata_filter=None):
+        """
+        Rank stored chunks by cosine similarity to the query embedding.
+        Filters on chunking type and metadata are applied before ranking.
+
+        Returns:
+            list: Top-k results sorted by similarity in descending order.
+        """
+        input_embedding = self.embedding_handler.get_embedding(query)
+
+        if self.search_mode == 'database':
+            results = self.search_database(
+                input_embedding, document_type, agent_id, top_k, chunking_type, metadata_filter)
+        else:
+            # Search the cached in-memory index for this agent and filter
+            index = self.get_index(document_type, agent_id, chunking_type, metadata_filter)
+            results = index.search(input_embedding, top_k)
+        for result in results:
+            result['source'] = 'similarity'
+        return results
 
-    def retrieve(self, query, agent_id, document_type='documents', top_k=3, chunking_type='agentic'):
+    @staticmethod
+    def reciprocal_rank_fusion(result_lists, top_k, k=60):
+        """
+        Fuse several ranked result lists with reciprocal rank fusion.
+
+        Args:
+            result_lists (list): Ranked result lists; results are matched on their 'answer' text.
+            top_k (int): Number of fused results to return.
+            k (int): RRF damping constant.
+
+        Returns:
+            list: Fused results; 'similarity' holds the fused score.
+        """
+        fused = {}
+        for results in result_lists:
+            for rank, result in enumerate(results):
+                entry = fused.setdefault(result['answer'], {**result, 'similarity': 0.0, 'source': 'hybrid'})
+                entry['similarity'] += 1.0 / (k + rank + 1)
+        return sorted(fused.values(), key=lambda x: x['similarity'], reverse=True)[:top_k]
+
+    def retrieve(self, query, agent_id, document_type='documents', top_k=3, chunking_type=None, method='similarity',
+                 metadata_filter=None):
         """
         Retrieve the most relevant results based on the specified method.
 
@@ -141,17 +329,27 @@ class RAGPipeline:
             query (str): The input query.
             document_type (str): The type of document to search in ('documents' or 'qa_pairs').
             top_k (int): The number of top results to return.
-            chunking_type (str): The type of chunking applied.
+            chunking_type (str, optional): Only search chunks produced by this chunker. Defaults to all.
             method (str): The retrieval method ('similarity', 'keyword', 'hybrid').
+            metadata_filter (dict, optional): Only search chunks whose metadata has these values,
+                e.g. {"source": "Custom Upload"}.
 
         Returns:
             list: The top results based on the specified method.
         """
-        # Generate embedding for the query (if similarity or hybrid search)
-        input_embedding = self.embedding_handler.get_embedding(query)
-
-        # Fetch data based on document type
-        stored_data = self.fetch_data(document_type, chunking_type, agent_id)
-        is_qa_pairs = (document_type == 'qa_pairs')
+        if method == 'similarity':
+            return self.similarity_search(query, agent_id, document_type, top_k, chunking_type, metadata_filter)
 
-        return self.calculate_similarities(input_embedding, stored_data, is_qa_pairs, top_k)
+        if document_type != 'documents':
+            raise ValueError(f"Keyword search is not supported for document type: {document_type}")
+        if method == 'keyword':
+            return self.keyword_search(query, agent_id, top_k, chunking_type, metadata_filter)
+        if method == 'hybrid':
+            # Fuse deeper candidate lists than we return so both rankings can contribute
+            candidates = top_k * 3
+            similarity = self.executor.submit(
+                self.similarity_search, query, agent_id, document_type, candidates, chunking_type, metadata_filter)
+            keyword = self.executor.submit(
+                self.keyword_search, query, agent_id, candidates, chunking_type, metadata_filter)
+            return self.reciprocal_rank_fusion([similarity.result(), keyword.result()], top_k)
+        raise ValueError(f"Unsupported retrieval method: {method}")
@@ -0,0 +1,56 @@
+import time
+import threading
+
+
+class RateLimiter:
+    """
+    A thread-safe limiter for requests-per-minute and tokens-per-minute budgets.
+    Both budgets are token buckets that refill continuously, so short bursts up to
+    one minute's budget are allowed while the average rate stays within the limit.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        """
+        Args:
+            requests_per_minute (int, optional): Request budget. None means unlimited.
+            tokens_per_minute (int, optional): Token budget. None means unlimited.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """
+        Block until one request using the given number of tokens fits in both budgets.
+        A request larger than the whole token budget waits for a full bucket and then goes through.
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                tokens_needed = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+                wait = 0.0
+                if self.requests_per_minute and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60.0 / self.requests_per_minute)
+                if self.tokens_per_minute and self._tokens < tokens_needed:
+                    wait = max(wait, (tokens_needed - self._tokens) * 60.0 / self.tokens_per_minute)
+                if wait == 0.0:
+                    if self.requests_per_minute:
+                        self._requests -= 1
+                    if self.tokens_per_minute:
+                        self._tokens -= tokens_needed
+                    return
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute,
+                                 self._requests + elapsed * self.requests_per_minute / 60.0)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute,
+                               self._tokens + elapsed * self.tokens_per_minute / 60.0)
@@ -0,0 +1,157 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def _hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RerankCache:
+    """
+    An LRU cache of rerank scores keyed by reranker, query hash and candidate document hashes.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(reranker_name, query, documents):
+        return (reranker_name, _hash_text(query), tuple(_hash_text(document) for document in documents))
+
+    def get(self, key):
+        with self._lock:
+            scores = self._entries.get(key)
+            if scores is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return scores
+
+    def put(self, key, scores):
+        with self._lock:
+            self._entries[key] = scores
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class BaseReranker:
+    """
+    A base class for all rerankers. Subclasses score every candidate document against the query;
+    the base class handles caching and top-n selection.
+    """
+
+    name = "base"
+
+    def __init__(self, cache_size=1024):
+        self.cache = RerankCache(cache_size) if cache_size else None
+
+    def rerank(self, query, documents, top_n):
+        """
+        Rank documents by relevance to the query.
+
+        Args:
+            query (str): The input query.
+            documents (list): Candidate document texts.
+            top_n (int): Number of results to return.
+
+        Returns:
+            list: (document index, relevance score) tuples, most relevant first.
+        """
+        if not documents:
+            return []
+
+        key = RerankCache.make_key(self.name, query, documents) if self.cache else None
+        scores = self.cache.get(key) if self.cache else None
+        if scores is None:
+            scores = np.asarray(self._score(query, documents), dtype=np.float32)
+            if self.cache:
+                self.cache.put(key, scores)
+
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [(int(i), float(scores[i])) for i in order]
+
+    def _score(self, query, documents):
+        """
+        Score every document. To be implemented by subclasses.
+        """
+        raise NotImplementedError(
+            "This method should be implemented by subclasses.")
+
+
+class CohereReranker(BaseReranker):
+    """
+    Reranks with Cohere's hosted rerank API.
+    """
+
+    name = "cohere"
+
+    def __init__(self, model="rerank-english-v2.0", api_key=None, cache_size=1024):
+        super().__init__(cache_size)
+        import cohere
+        self.model = model
+        self.client = cohere.Client(api_key=api_key or os.getenv("COHERE_API_KEY"))
+
+    def _score(self, query, documents):
+        response = self.client.rerank(
+            query=query,
+            documents=documents,
+            top_n=len(documents),
+            model=self.model
+        )
+        scores = np.zeros(len(documents), dtype=np.float32)
+        for result in response.results:
+            scores[result.index] = result.relevance_score
+        return scores
+
+
+class CrossEncoderReranker(BaseReranker):
+    """
+    Reranks locally with a sentence-transformers cross-encoder, in batches on the CPU by default.
+    """
+
+    name = "cross-encoder"
+
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=32,
+                 device="cpu", backend="torch", cache_size=1024):
+        """
+        Args:
+            model_name (str): Hugging Face id of the cross-encoder model.
+            batch_size (int): Number of (query, document) pairs scored per forward pass.
+            device (str): Torch device to run on.
+            backend (str): 'torch', or 'onnx' for an exported (optionally quantized) model.
+        """
+        super().__init__(cache_size)
+        from sentence_transformers import CrossEncoder
+        self.batch_size = batch_size
+        kwargs = {"device": device}
+        if backend != "torch":
+            kwargs["backend"] = backend
+        self.model = CrossEncoder(model_name, **kwargs)
+        self.name = f"cross-encoder:{model_name}"
+
+    def _score(self, query, documents):
+        pairs = [(query, document) for document in documents]
+        return self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+
+
+class RerankerFactory:
+    """
+    A factory class to create different types of rerankers.
+    """
+    @staticmethod
+    def create_reranker(reranker_type, **kwargs):
+        if reranker_type == "cohere":
+            return CohereReranker(**kwargs)
+        elif reranker_type == "cross-encoder":
+            return CrossEncoderReranker(**kwargs)
+        else:
+            raise ValueError(f"Unknown reranker type: {reranker_type}")
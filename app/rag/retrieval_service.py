@@ -0,0 +1,67 @@
+import threading
+from app.data.handlers.db_handler import DatabaseHandler
+from app.data.handlers.embedding_handler import EmbeddingHandler
+from app.config.config import get_db_config, get_db_pool_config, get_embedding_config, get_retrieval_config
+from app.rag.rag import RAGPipeline
+
+
+class RetrievalService:
+    """
+    Process-wide owner of the database pool, embedding handler and RAG pipeline,
+    so tools reuse warm clients, indexes and caches instead of rebuilding them per call.
+    """
+
+    def __init__(self, db_handler=None, embedding_handler=None, retrieval_config=None):
+        """
+        Initialize the service.
+
+        Args:
+            db_handler (DatabaseHandler, optional): Shared handler. Defaults to a new pooled handler.
+            embedding_handler (EmbeddingHandler, optional): Shared handler. Defaults to a new handler.
+            retrieval_config (dict, optional): Keyword arguments for RAGPipeline.
+        """
+        self.db_handler = db_handler or DatabaseHandler(**get_db_config(), **get_db_pool_config())
+        self.embedding_handler = embedding_handler or EmbeddingHandler(**get_embedding_config())
+        self.rag_pipeline = RAGPipeline(
+            self.db_handler, self.embedding_handler, **(retrieval_config or get_retrieval_config()))
+
+    def retrieve(self, query, agent_id, **kwargs):
+        """
+        Retrieve the most relevant results for a query. See RAGPipeline.retrieve.
+        """
+        return self.rag_pipeline.retrieve(query=query, agent_id=agent_id, **kwargs)
+
+    def warm(self, agent_ids, document_type='documents'):
+        """
+        Load the vector indexes of the given agents ahead of their first query.
+        """
+        for agent_id in agent_ids:
+            self.rag_pipeline.get_index(document_type, agent_id)
+
+    def close(self):
+        self.db_handler.close_connection()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def init_retrieval_service(**kwargs):
+    """
+    Create the process-wide retrieval service. Call once at application startup.
+
+    Returns:
+        RetrievalService: The shared service.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RetrievalService(**kwargs)
+        return _service
+
+
+def get_retrieval_service():
+    """
+    Return the process-wide retrieval service, creating it with the default config if needed.
+    """
+    return _service or init_retrieval_service()
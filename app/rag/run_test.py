@@ -1,9 +1,8 @@
-import os
 from app.data.handlers.db_handler import DatabaseHandler
 from app.data.handlers.embedding_handler import EmbeddingHandler
 from dotenv import load_dotenv
 from app.rag.rag import RAGPipeline
-from app.config.config import get_db_config
+from app.config.config import get_db_config, get_embedding_config
 from openai import OpenAI
 from tabulate import tabulate
 
@@ -13,6 +12,7 @@ load_dotenv()
 # Initialize OpenAI and environment
 client = OpenAI()
 source = "documents"
+agent_id = 12345  # Agent the evaluation documents were ingested for (see ingest_data.py)
 
 # Queries and corresponding answers
 qa_pairs = [
@@ -34,10 +34,7 @@ retrieval_methods = ["hybrid", "similarity", "keyword"]
 
 # Initialize Database and Embedding handlers
 db_handler = DatabaseHandler(**get_db_config())
-embedding_handler = EmbeddingHandler(
-    model_name="openai",
-    openai_api_key=os.getenv("OPENAI_API_KEY")
-)
+embedding_handler = EmbeddingHandler(**get_embedding_config())
 
 # Initialize RAG pipeline
 rag_pipeline = RAGPipeline(db_handler, embedding_handler)
@@ -51,6 +48,7 @@ def calculate_similarity_scores(query, answer, chunking_type, retrieval_method):
         # Retrieve top-k results
         results = rag_pipeline.retrieve(
             query,
+            agent_id=agent_id,
             document_type=source,
             top_k=6,  # Top results to retrieve
             chunking_type=chunking_type,
@@ -63,7 +61,7 @@ def calculate_similarity_scores(query, answer, chunking_type, retrieval_method):
             result.setdefault("similarity", 0)
 
         # Re-rank results based on the answer, not the query
-        reranked_results = rag_pipeline.rerank_results(answer, results, top_k=3)
+        reranked_results = rag_pipeline.rerank_results(answer, results, top_k=3, agent_id=agent_id)
         print(f"Chunking: {chunking_type}, Retrieval: {retrieval_method}\n", reranked_results)
 
         # Sum the similarity scores of the re-ranked results
@@ -0,0 +1,77 @@
+import re
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+import tiktoken
+
+WORD_BOUNDARIES = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name='cl100k_base'):
+    """Return a tiktoken encoding, loading each one only once per process."""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def boundary_offsets(text, pattern=WORD_BOUNDARIES):
+    """
+    Character offsets where a chunk may start: the end of every match of pattern.
+    """
+    return [match.end() for match in pattern.finditer(text)]
+
+
+def token_spans(text, max_tokens, overlap_tokens=0, encoding=None, boundaries=None):
+    """
+    Split text into spans of at most max_tokens tokens. The text is encoded once, and each
+    span ends at the last boundary that fits, or mid-sentence when a single segment is
+    longer than max_tokens. Consecutive spans share up to overlap_tokens tokens of whole
+    segments.
+    Args:
+        text (str): The input text.
+        max_tokens (int): Maximum number of tokens per span.
+        overlap_tokens (int): Tokens repeated at the start of the next span.
+        encoding (tiktoken.Encoding, optional): Defaults to cl100k_base.
+        boundaries (list, optional): Sorted character offsets where spans may start.
+            Defaults to word boundaries.
+    Returns:
+        list: (start, end) character offsets into text.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    encoding = encoding or get_encoding()
+    tokens = encoding.encode_ordinary(text)
+    token_count = len(tokens)
+    if token_count == 0:
+        return []
+    _, offsets = encoding.decode_with_offsets(tokens)
+    if boundaries is None:
+        boundaries = boundary_offsets(text)
+
+    # Cut before the token that contains each boundary character
+    cuts = sorted({bisect_right(offsets, position) - 1 for position in boundaries if position < len(text)})
+    cuts = [cut for cut in cuts if cut > 0]
+
+    spans = []
+    start = 0
+    while start < token_count:
+        limit = start + max_tokens
+        if limit >= token_count:
+            end = token_count
+        else:
+            i = bisect_right(cuts, limit) - 1
+            end = cuts[i] if i >= 0 and cuts[i] > start else limit
+        spans.append((offsets[start], offsets[end] if end < token_count else len(text)))
+        if end >= token_count:
+            break
+
+        next_start = end
+        if overlap_tokens:
+            # Start the next span at the first boundary inside the overlap window
+            i = bisect_left(cuts, max(end - overlap_tokens, start + 1))
+            j = bisect_left(cuts, end)
+            if i < len(cuts) and cuts[i] < end:
+                next_start = cuts[i]
+            elif j == len(cuts) or cuts[j] != end:
+                # The span was cut mid-segment, so overlap by tokens instead
+                next_start = max(end - overlap_tokens, start + 1)
+        start = next_start
+    return spans
@@ -0,0 +1,182 @@
+import threading
+import numpy as np
+from app.data.handlers.vector_codec import decode_embeddings
+
+
+class VectorIndex:
+    """
+    An in-memory index holding all embeddings of a corpus as one contiguous,
+    L2-normalized float32 matrix, with parallel arrays for the stored texts.
+    """
+
+    def __init__(self, embeddings, answers, questions=None, ids=None):
+        """
+        Initialize the index.
+
+        Args:
+            embeddings (array): Matrix of shape (n, dim) with the stored embeddings.
+            answers (list): Text returned as 'answer' for every row.
+            questions (list, optional): Text returned as 'question' for every row.
+            ids (list, optional): Database ids for every row.
+        """
+        matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(answers), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = matrix / norms
+        self.answers = np.asarray(answers, dtype=object)
+        self.questions = np.asarray(
+            questions if questions is not None else [None] * len(answers), dtype=object)
+        self.ids = np.asarray(ids if ids is not None else [None] * len(answers), dtype=object)
+
+    def __len__(self):
+        return len(self.answers)
+
+    @classmethod
+    def from_records(cls, records, embedding_column, answer_column, question_column=None, id_column=None):
+        """
+        Build an index from database rows.
+
+        Args:
+            records (list): Rows as returned by DatabaseHandler.fetch_data.
+            embedding_column (str): Column holding the embedding.
+            answer_column (str): Column holding the text returned as 'answer'.
+            question_column (str, optional): Column holding the text returned as 'question'.
+            id_column (str, optional): Column holding the row id.
+
+        Returns:
+            VectorIndex: The populated index.
+        """
+        matrix, valid = decode_embeddings([record[embedding_column] for record in records])
+        for i in np.flatnonzero(~valid):
+            print(f"Error processing record: {records[i]}")
+
+        kept = [records[i] for i in np.flatnonzero(valid)]
+        matrix = matrix[valid]
+        answers = [record[answer_column] for record in kept]
+        questions = [record[question_column] for record in kept] if question_column else None
+        ids = [record[id_column] for record in kept] if id_column else None
+        return cls(matrix, answers, questions, ids)
+
+    @classmethod
+    def from_batches(cls, batches, embedding_column, answer_column, question_column=None, id_column=None):
+        """
+        Build an index from column-oriented batches, so the rows never exist as one list of dicts.
+
+        Args:
+            batches (iterable): Batches as yielded by DatabaseHandler.iter_batches with embedding_column.
+            embedding_column (str): Column holding the embedding matrix.
+            answer_column (str): Column holding the text returned as 'answer'.
+            question_column (str, optional): Column holding the text returned as 'question'.
+            id_column (str, optional): Column holding the row id.
+
+        Returns:
+            VectorIndex: The populated index.
+        """
+        blocks, answers, questions, ids = [], [], [], []
+        for batch in batches:
+            blocks.append(batch[embedding_column])
+            answers.extend(batch[answer_column])
+            if question_column:
+                questions.extend(batch[question_column])
+            if id_column:
+                ids.extend(batch[id_column])
+        matrix = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+        return cls(matrix, answers, questions if question_column else None, ids if id_column else None)
+
+    def search(self, query_embedding, top_k=6):
+        """
+        Return the top-k rows by cosine similarity to the query.
+
+        Args:
+            query_embedding (array): The embedding of the input query.
+            top_k (int): Number of top results to return.
+
+        Returns:
+            list: Top-k results sorted by similarity in descending order.
+        """
+        if len(self) == 0 or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+
+        scores = self.embeddings @ query
+        top_k = min(top_k, len(scores))
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind='stable')]
+
+        return [
+            {
+                'id': self.ids[i],
+                'question': self.questions[i],
+                'answer': self.answers[i],
+                'similarity': float(scores[i])
+            }
+            for i in order
+        ]
+
+
+class VectorIndexCache:
+    """
+    A process-wide cache of VectorIndex objects keyed by tuples starting with
+    (document_type, agent_id).
+    Indexes are built once on first use and reused until explicitly invalidated.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        Return the cached index for a key, building it with loader() on a miss.
+
+        Args:
+            key (tuple): (document_type, agent_id, ...) key.
+            loader (callable): Returns a new VectorIndex when called.
+
+        Returns:
+            VectorIndex: The cached index.
+        """
+        with self._lock:
+            index = self._indexes.get(key)
+            generation = self._generation
+        if index is not None:
+            return index
+
+        # Build outside the lock so a slow load does not block other agents
+        index = loader()
+        with self._lock:
+            # Don't cache an index that was invalidated while it was being built
+            if generation != self._generation:
+                return index
+            return self._indexes.setdefault(key, index)
+
+    def invalidate(self, agent_id=None, document_type=None):
+        """
+        Drop cached indexes so they are rebuilt on the next query.
+
+        Args:
+            agent_id (int, optional): Only drop indexes for this agent.
+            document_type (str, optional): Only drop indexes for this document type.
+        """
+        with self._lock:
+            self._generation += 1
+            for key in list(self._indexes):
+                cached_type, cached_agent = key[:2]
+                if agent_id is not None and str(cached_agent) != str(agent_id):
+                    continue
+                if document_type is not None and cached_type != document_type:
+                    continue
+                del self._indexes[key]
+
+
+vector_index_cache = VectorIndexCache()
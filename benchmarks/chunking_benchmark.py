@@ -0,0 +1,90 @@
+"""
+Benchmark for token-limited chunking: the old per-word encode loop of chunk_text against
+the encode-once splitter, and the sentence-aligned TokenChunker, on a synthetic document.
+
+Usage:
+    python -m benchmarks.chunking_benchmark --pages 500 --max-tokens 256
+"""
+import argparse
+import time
+import numpy as np
+from app.data.handlers.embedding_handler import chunk_text
+from app.rag.chunking import TokenChunker
+from app.rag.token_chunking import get_encoding
+
+WORDS = (
+    "order delivery refund customer account payment invoice shipping warehouse product "
+    "return policy support ticket tracking number address billing subscription discount "
+    "the a of to and in is for with on that this be are it as at by from"
+).split()
+CHARS_PER_PAGE = 3000
+
+
+def make_document(pages, seed=0):
+    """Build a document of roughly CHARS_PER_PAGE characters of sentences per page."""
+    rng = np.random.default_rng(seed)
+    page_texts = []
+    for _ in range(pages):
+        sentences = []
+        size = 0
+        while size < CHARS_PER_PAGE:
+            words = rng.choice(WORDS, size=rng.integers(6, 25))
+            sentence = " ".join(words).capitalize() + rng.choice([".", ".", "?"])
+            sentences.append(sentence)
+            size += len(sentence) + 1
+        page_texts.append(" ".join(sentences))
+    return "\n".join(page_texts)
+
+
+def chunk_text_word_loop(text, max_tokens, encoding_name='cl100k_base'):
+    """The previous chunk_text: one tokenizer call per whitespace word."""
+    import tiktoken
+    encoding = tiktoken.get_encoding(encoding_name)
+    chunks = []
+    current_chunk = []
+    current_tokens = 0
+    for word in text.split():
+        word_tokens = len(encoding.encode(word))
+        if current_tokens + word_tokens > max_tokens:
+            chunks.append(' '.join(current_chunk))
+            current_chunk = [word]
+            current_tokens = word_tokens
+        else:
+            current_chunk.append(word)
+            current_tokens += word_tokens
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def token_chunker(text, max_tokens):
+    chunks = TokenChunker(text, max_chunk_size=max_tokens, overlap_tokens=0).process_document()
+    return [chunk.text for chunk in chunks]
+
+
+def run(pages, max_tokens):
+    encoding = get_encoding()
+    document = make_document(pages)
+    methods = [
+        ("word loop", lambda: chunk_text_word_loop(document, max_tokens)),
+        ("encode once", lambda: chunk_text(document, max_tokens)),
+        ("token chunker", lambda: token_chunker(document, max_tokens)),
+    ]
+    print(f"{pages} pages, {len(document)} characters, {len(encoding.encode_ordinary(document))} tokens")
+    print(f"{'method':>14} {'seconds':>10} {'chunks':>8} {'max tokens':>11} {'over limit':>11}")
+    for name, func in methods:
+        start = time.perf_counter()
+        chunks = func()
+        elapsed = time.perf_counter() - start
+        # Measure every chunk as it will actually be tokenized when embedded
+        sizes = [len(encoding.encode_ordinary(chunk)) for chunk in chunks]
+        over = sum(size > max_tokens for size in sizes)
+        print(f"{name:>14} {elapsed:>10.3f} {len(chunks):>8} {max(sizes):>11} {over:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    args = parser.parse_args()
+    run(args.pages, args.max_tokens)
@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for decoding stored embeddings: the old per-row eval() path
+against the bulk NumPy decoder used by DatabaseHandler and VectorIndex.
+
+Usage:
+    python -m benchmarks.embedding_decode_benchmark --rows 10000 100000
+"""
+import argparse
+import time
+import numpy as np
+from app.data.handlers.vector_codec import decode_embeddings, parse_vector
+
+DIMENSIONS = 1536
+DISTINCT_ROWS = 1000
+
+
+def make_rows(count, dim=DIMENSIONS, seed=0):
+    """
+    Build `count` pgvector text values. A pool of distinct strings is reused so
+    100k rows don't need gigabytes of memory just to set up the benchmark.
+    """
+    rng = np.random.default_rng(seed)
+    pool = [
+        "[" + ",".join(f"{value:.8f}" for value in rng.standard_normal(dim)) + "]"
+        for _ in range(min(count, DISTINCT_ROWS))
+    ]
+    return [pool[i % len(pool)] for i in range(count)]
+
+
+def decode_with_eval(rows):
+    return np.vstack([np.array(eval(row)) for row in rows])
+
+
+def decode_with_typecaster(rows):
+    # What the registered typecaster does per row, followed by stacking
+    return np.vstack([parse_vector(row) for row in rows])
+
+
+def decode_in_bulk(rows):
+    matrix, _ = decode_embeddings(rows, DIMENSIONS)
+    return matrix
+
+
+def time_it(func, rows):
+    start = time.perf_counter()
+    result = func(rows)
+    elapsed = time.perf_counter() - start
+    return elapsed, result.nbytes
+
+
+def run(row_counts):
+    methods = [
+        ("eval", decode_with_eval),
+        ("typecaster", decode_with_typecaster),
+        ("bulk", decode_in_bulk),
+    ]
+    print(f"{'rows':>8} {'method':>12} {'seconds':>10} {'rows/s':>12} {'matrix MB':>10}")
+    for count in row_counts:
+        rows = make_rows(count)
+        for name, func in methods:
+            elapsed, nbytes = time_it(func, rows)
+            print(f"{count:>8} {name:>12} {elapsed:>10.3f} {count / elapsed:>12.0f} {nbytes / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+    run(args.rows)
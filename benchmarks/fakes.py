@@ -0,0 +1,303 @@
+"""
+Deterministic local stand-ins for the embedding API, the reranker, the chunking LLM,
+the document table and PDF reading, plus a synthetic corpus generator, so the retrieval
+and ingestion code paths can be benchmarked offline.
+"""
+import re
+import time
+import zlib
+from types import SimpleNamespace
+import numpy as np
+from app.rag.rerankers import BaseReranker
+from app.data.handlers.embedding_handler import EmbeddingHandler
+from app.data.insert.pdf_processor import PDFProcessor
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "pa", "di", "fo", "gu", "he", "ji", "wo"]
+
+
+def make_vocabulary(size=5000):
+    """Pronounceable pseudo-words; the same size always gives the same list."""
+    words = []
+    for i in range(size):
+        word = ""
+        n = i + len(SYLLABLES)
+        while n:
+            n, digit = divmod(n, len(SYLLABLES))
+            word += SYLLABLES[digit]
+        words.append(word)
+    return words
+
+
+class FakeEmbeddingHandler:
+    """
+    Embeds a text as the normalized sum of fixed random vectors of its words, so texts that
+    share words are similar, like a real model, at NumPy speed and without network calls.
+    """
+
+    def __init__(self, vocabulary, dim=384, seed=0, latency=0.0):
+        """
+        Args:
+            vocabulary (list): Known words; unknown words are hashed onto them.
+            dim (int): Embedding dimension.
+            latency (float): Seconds slept per request, to model an API round trip.
+        """
+        self.vocabulary = vocabulary
+        self.word_ids = {word: i for i, word in enumerate(vocabulary)}
+        self.word_vectors = np.random.default_rng(seed).standard_normal((len(vocabulary), dim)).astype(np.float32)
+        self.latency = latency
+        self.cache_model_name = "fake"
+        self.requests = 0
+
+    def encode_ids(self, word_ids):
+        """
+        Embed texts given as a matrix of word ids, one row per text, in bulk.
+        """
+        matrix = np.zeros((word_ids.shape[0], self.word_vectors.shape[1]), dtype=np.float32)
+        for column in range(word_ids.shape[1]):
+            matrix += self.word_vectors[word_ids[:, column]]
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix
+
+    def _ids(self, text):
+        return [
+            self.word_ids.get(word, zlib.crc32(word.encode("utf-8")) % len(self.vocabulary))
+            for word in re.findall(r"\w+", text.lower())
+        ] or [0]
+
+    def get_embedding(self, text):
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        vectors = []
+        for text in texts:
+            vector = self.word_vectors[self._ids(text)].sum(axis=0)
+            vectors.append((vector / max(np.linalg.norm(vector), 1e-12)).tolist())
+        return vectors
+
+
+class FakeAPIEmbeddingHandler(EmbeddingHandler):
+    """
+    The real EmbeddingHandler in OpenAI mode, with request packing, the shared executor and
+    the cache, whose embeddings requests are answered by a FakeEmbeddingHandler instead.
+    """
+
+    def __init__(self, fake, max_concurrency=4, cache_config=None):
+        super().__init__('openai', openai_api_key='fake', max_concurrency=max_concurrency,
+                         cache_config=cache_config)
+        self.fake = fake
+
+    def _embed_batch(self, batch):
+        start, texts = batch
+        return start, self.fake.get_embeddings(texts)
+
+
+class FakeReranker(BaseReranker):
+    """
+    Scores documents by the fraction of query words they contain.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=0.0, cache_size=0):
+        super().__init__(cache_size)
+        self.latency = latency
+
+    def _score(self, query, documents):
+        if self.latency:
+            time.sleep(self.latency)
+        terms = set(re.findall(r"\w+", query.lower()))
+        return [
+            len(terms.intersection(re.findall(r"\w+", document.lower()))) / max(len(terms), 1)
+            for document in documents
+        ]
+
+
+class FakeLLMClient:
+    """
+    Stands in for the OpenAI client in AgenticChunker: beta.chat.completions.parse groups
+    every few sentences of the prompt into one chunk and returns them as structured output.
+    """
+
+    def __init__(self, sentences_per_chunk=3, latency=0.0):
+        self.sentences_per_chunk = sentences_per_chunk
+        self.latency = latency
+        self.requests = 0
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    def parse(self, model, messages, response_format):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = messages[-1]["content"]
+        sentences = prompt.split("Sentences:\n", 1)[1].split("\n\n", 1)[0].split("\n")
+        groups = [
+            " ".join(sentences[i:i + self.sentences_per_chunk])
+            for i in range(0, len(sentences), self.sentences_per_chunk)
+        ]
+        parsed = response_format(chunks=[{"sentences": group} for group in groups])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed))])
+
+
+class SyntheticCorpus:
+    """
+    Chunks of topic-clustered pseudo-words with word frequencies following a Zipf-like
+    curve, stored column-wise: ids, contents and an embedding matrix.
+    """
+
+    def __init__(self, size, embedding_handler, words_per_chunk=40, topics=50, seed=0, block_size=10000):
+        """
+        Args:
+            size (int): Number of chunks.
+            embedding_handler (FakeEmbeddingHandler): Embeds the chunks; its vocabulary is used.
+            words_per_chunk (int): Words in every chunk.
+            topics (int): Topics the chunks are drawn from; a topic favours its own words.
+            block_size (int): Chunks generated at a time, bounding temporary memory.
+        """
+        rng = np.random.default_rng(seed)
+        vocabulary = np.asarray(embedding_handler.vocabulary, dtype=object)
+        weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+        weights /= weights.sum()
+        topic_words = rng.integers(0, len(vocabulary), size=(topics, 100))
+
+        self.ids = np.arange(1, size + 1)
+        self.contents = []
+        self.embeddings = np.empty((size, embedding_handler.word_vectors.shape[1]), dtype=np.float32)
+        for start in range(0, size, block_size):
+            count = min(block_size, size - start)
+            # 70% of the words come from the chunk's topic, the rest from the whole vocabulary
+            word_ids = rng.choice(len(vocabulary), size=(count, words_per_chunk), p=weights)
+            chunk_topics = rng.integers(0, topics, size=count)
+            from_topic = rng.random((count, words_per_chunk)) < 0.7
+            topical = topic_words[chunk_topics[:, None], rng.integers(0, 100, size=(count, words_per_chunk))]
+            word_ids = np.where(from_topic, topical, word_ids)
+            self.embeddings[start:start + count] = embedding_handler.encode_ids(word_ids)
+            self.contents.extend(" ".join(words) + "." for words in vocabulary[word_ids])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def make_queries(self, count, words=5, seed=1):
+        """Queries made of a few words of random chunks, with the ids of those chunks."""
+        rng = np.random.default_rng(seed)
+        queries = []
+        for row in rng.integers(0, len(self), size=count):
+            chunk_words = self.contents[row].rstrip(".").split()
+            picked = rng.choice(len(chunk_words), size=min(words, len(chunk_words)), replace=False)
+            queries.append((" ".join(chunk_words[i] for i in sorted(picked)), int(self.ids[row])))
+        return queries
+
+
+class FakeDatabaseHandler:
+    """
+    Serves a SyntheticCorpus as the agent_upload_docs table through the parts of the
+    DatabaseHandler interface that RAGPipeline uses for in-memory retrieval.
+    Every chunk belongs to the agent being queried, so agent and chunking filters match all rows.
+    """
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self._positions = {int(doc_id): i for i, doc_id in enumerate(corpus.ids)}
+
+    def iter_batches(self, table_name, columns=None, conditions=None, params=None, filters=None,
+                     batch_size=2000, embedding_column=None):
+        for start in range(0, len(self.corpus), batch_size):
+            end = start + batch_size
+            batch = {}
+            for column in columns:
+                if column == "id":
+                    batch[column] = self.corpus.ids[start:end].tolist()
+                elif column == "content":
+                    batch[column] = self.corpus.contents[start:end]
+                elif column == embedding_column:
+                    # A copy, as decoding a fetched batch would produce
+                    batch[column] = self.corpus.embeddings[start:end].copy()
+            yield batch
+
+    def select(self, table_name, columns=None, filters=None, **kwargs):
+        ids = next((value for column, operator, value in filters or [] if column == "id" and operator == "in"), None)
+        positions = [self._positions[doc_id] for doc_id in ids if doc_id in self._positions] if ids is not None \
+            else range(len(self.corpus))
+        return [
+            {"id": int(self.corpus.ids[i]), "content": self.corpus.contents[i], "embedding": self.corpus.embeddings[i]}
+            for i in positions
+        ]
+
+    def fetch_data(self, table_name, columns=None, conditions=None, limit=None, params=None):
+        return self.select(table_name, columns)
+
+
+class FakeUploadTable:
+    """
+    Serves Agent_Upload_Docs through the parts of the DatabaseHandler interface that
+    PDFProcessor uses, keeping every document's rows by content hash so the
+    (agent_id, title, content_hash) unique key is enforced on insert like in Postgres.
+    """
+
+    def __init__(self):
+        self.documents = {}  # (agent_id, title) -> content hash -> row
+        self._next_id = 1
+
+    def fetch_data(self, table_name, columns=None, conditions=None, limit=None, params=None):
+        rows = self.documents.get((params[0], params[1]), {})
+        if columns == ['MAX(document_version) AS version']:
+            return [{"version": max((row["document_version"] for row in rows.values()), default=None)}]
+        return [{"content_hash": chunk_hash} for chunk_hash in params[2] if chunk_hash in rows]
+
+    def update_row(self, table_name, updates, conditions, params=None):
+        rows = self.documents.get((params[0], params[1]), {})
+        updated = 0
+        for chunk_hash in params[2]:
+            if chunk_hash in rows:
+                rows[chunk_hash].update(updates)
+                updated += 1
+        return updated
+
+    def delete_row(self, table_name, conditions, params=None, returning=None):
+        rows = self.documents.get((params[0], params[1]), {})
+        stale = [chunk_hash for chunk_hash, row in rows.items() if row["document_version"] != params[2]]
+        return [{"id": rows.pop(chunk_hash)["id"]} for chunk_hash in stale]
+
+    def insert_many(self, table_name, rows, conflict_column=None, update_on_conflict=True,
+                    page_size=500, returning=None):
+        result = {"inserted": 0, "failed": [], "returned": []}
+        for row in rows:
+            stored = self.documents.setdefault((row["agent_id"], row["title"]), {})
+            if row["content_hash"] in stored:
+                continue
+            stored[row["content_hash"]] = {**row, "id": self._next_id}
+            self._next_id += 1
+            result["inserted"] += 1
+            if returning:
+                result["returned"].append({column: stored[row["content_hash"]][column] for column in returning})
+        return result
+
+
+class FakeTableManager:
+    """Accepts the table and index definitions PDFProcessor asks for, without creating anything."""
+
+    def create_table(self, table_name, columns, raw_data=None, vector_index=None, indexes=None):
+        pass
+
+    def create_vector_indexes(self, table_name, columns, vector_index):
+        pass
+
+
+class FakePDFProcessor(PDFProcessor):
+    """
+    The real PDFProcessor, reading the pages of documents registered by file path
+    instead of parsing PDF files.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pages = {}  # file path -> list of page texts
+
+    def _count_pages(self, file_path):
+        return len(self.pages[file_path])
+
+    def _iter_pdf_pages(self, file_path, page_count):
+        for page_number, page_text in enumerate(self.pages[file_path], start=1):
+            yield page_number, page_text
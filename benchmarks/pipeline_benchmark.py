@@ -0,0 +1,278 @@
+"""
+Offline benchmark of retrieval and ingestion: RAGPipeline search, rerank_results and
+calculate_similarities over synthetic corpora, and the chunkers and PDFProcessor's
+embed-and-store path over a synthetic document, with local stand-ins for OpenAI, Cohere,
+Postgres and PDF reading (see benchmarks/fakes.py).
+
+Reports per-stage latency percentiles, throughput and peak traced memory. Results can be
+saved as a baseline, and a later run compared against it flags stages that got slower.
+
+Usage:
+    python -m benchmarks.pipeline_benchmark --sizes 1000 10000 100000 --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_benchmark --sizes 1000 10000 100000 --baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_benchmark --sizes 1000000 --skip-ingestion   # needs several GB of RAM
+"""
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+from app.rag.rag import RAGPipeline
+from app.rag.vector_index import vector_index_cache
+from app.rag.keyword_index import KeywordIndex, KeywordIndexStore
+from benchmarks.fakes import (
+    FakeAPIEmbeddingHandler, FakeDatabaseHandler, FakeEmbeddingHandler, FakeLLMClient, FakePDFProcessor,
+    FakeReranker, FakeTableManager, FakeUploadTable, SyntheticCorpus, make_vocabulary)
+
+TOP_K = 6
+
+
+def measure(func, calls, items_per_call=1, trace_memory=True):
+    """
+    Time func over its calls, then run it once more under tracemalloc for its peak memory,
+    so tracing overhead does not skew the latencies.
+    Args:
+        func (callable): Called with each element of calls.
+        calls (list): Arguments, one per timed call.
+        items_per_call (int): Items one call processes, for throughput.
+    Returns:
+        dict: Latency percentiles in ms, items per second and peak MB.
+    """
+    latencies = []
+    for argument in calls:
+        start = time.perf_counter()
+        func(argument)
+        latencies.append(time.perf_counter() - start)
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            func(calls[0])
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "calls": len(latencies),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "throughput": float(len(latencies) * items_per_call / (latencies.sum() / 1000)),
+        "peak_mb": peak,
+    }
+
+
+def make_pipeline(corpus, embedding_handler, index_dir):
+    pipeline = RAGPipeline(
+        FakeDatabaseHandler(corpus), embedding_handler, search_mode='memory',
+        reranker_config={"default": "fake", "agents": {}, "options": {}})
+    pipeline.rerankers["fake"] = FakeReranker()
+    pipeline.keyword_index_store = KeywordIndexStore(index_dir)
+    return pipeline
+
+
+def benchmark_retrieval(size, embedding_handler, queries, trace_memory, scan_limit):
+    """
+    Returns:
+        dict: Stage name -> measurements for a corpus of the given size.
+    """
+    corpus = SyntheticCorpus(size, embedding_handler)
+    agent_id = size  # A separate cache entry per corpus
+    questions = [text for text, _ in corpus.make_queries(queries)]
+    results = {}
+    with tempfile.TemporaryDirectory() as index_dir:
+        pipeline = make_pipeline(corpus, embedding_handler, index_dir)
+
+        def build_vector_index(_):
+            vector_index_cache.invalidate(agent_id=agent_id)
+            pipeline.get_index('documents', agent_id)
+
+        def build_keyword_index(query):
+            pipeline.keyword_index_store.invalidate(agent_id)
+            pipeline.keyword_search(query, agent_id, TOP_K)
+
+        results["build_vector_index"] = measure(build_vector_index, [None], size, trace_memory)
+        results["build_keyword_index"] = measure(build_keyword_index, questions[:1], size, trace_memory)
+        # Leave both indexes built for the query stages
+        build_vector_index(None)
+        build_keyword_index(questions[0])
+
+        results["similarity_search"] = measure(
+            lambda query: pipeline.similarity_search(query, agent_id, top_k=TOP_K), questions, 1, trace_memory)
+        results["keyword_search"] = measure(
+            lambda query: pipeline.keyword_search(query, agent_id, TOP_K), questions, 1, trace_memory)
+        results["hybrid_retrieve"] = measure(
+            lambda query: pipeline.retrieve(query, agent_id, top_k=TOP_K, method='hybrid'), questions, 1, trace_memory)
+
+        candidates = {query: pipeline.retrieve(query, agent_id, top_k=TOP_K * 3, method='hybrid') for query in questions}
+        results["rerank_results"] = measure(
+            lambda query: pipeline.rerank_results(query, candidates[query], TOP_K, agent_id), questions, 1, trace_memory)
+
+        if size <= scan_limit:
+            # The uncached path: rows fetched as dicts and ranked by building an index per call
+            stored_data = pipeline.db_handler.select('agent_upload_docs')
+            embeddings = {query: embedding_handler.get_embedding(query) for query in questions}
+            results["calculate_similarities"] = measure(
+                lambda query: pipeline.calculate_similarities(embeddings[query], stored_data, False, TOP_K),
+                questions[:5], 1, trace_memory)
+            del stored_data
+
+        vector_index_cache.invalidate(agent_id=agent_id)
+    return results
+
+
+def make_document(pages, vocabulary, seed=0, chars_per_page=3000):
+    """Pages of sentences of pseudo-words, joined with newlines."""
+    rng = np.random.default_rng(seed)
+    words = np.asarray(vocabulary[:2000], dtype=object)
+    page_texts = []
+    for _ in range(pages):
+        sentences = []
+        size = 0
+        while size < chars_per_page:
+            sentence = " ".join(rng.choice(words, size=rng.integers(6, 25))).capitalize() + "."
+            sentences.append(sentence)
+            size += len(sentence) + 1
+        page_texts.append(" ".join(sentences))
+    return "\n".join(page_texts)
+
+
+def make_processor(embedding_handler, table):
+    from app.rag.token_chunking import get_encoding
+
+    return FakePDFProcessor(
+        FakeTableManager(), FakeAPIEmbeddingHandler(embedding_handler), table, get_encoding('cl100k_base'))
+
+
+def benchmark_ingestion(pages, vocabulary, embedding_handler, trace_memory):
+    """
+    Returns:
+        dict: Stage name -> measurements for chunking a document of the given number of pages,
+            and for ingesting it with PDFProcessor: first as a new document, then unchanged again.
+    """
+    from app.rag.chunking import AgenticChunker, ChunkerFactory
+
+    document = make_document(pages, vocabulary)
+    chunkers = {
+        "chunk_static": lambda _: ChunkerFactory.create_chunker("static", document).process_document(),
+        "chunk_overlap": lambda _: ChunkerFactory.create_chunker("overlap", document).process_document(),
+        "chunk_token": lambda _: ChunkerFactory.create_chunker("token", document).process_document(),
+        "chunk_agentic": lambda _: AgenticChunker(
+            document, client=FakeLLMClient(), max_concurrency=4).process_document(),
+    }
+    results = {}
+    for name, func in chunkers.items():
+        try:
+            results[name] = measure(func, [None], pages, trace_memory)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+
+    texts = [chunk.text for chunk in ChunkerFactory.create_chunker("static", document).process_document()]
+    results["keyword_index_add"] = measure(
+        lambda _: KeywordIndex().add_documents(list(range(len(texts))), texts), [None], len(texts), trace_memory)
+
+    # process_pdf over the document's pages: chunking, batched embedding requests and
+    # batched inserts, with the hash lookups of 'diff' mode
+    def ingest(processor):
+        processor.pages["document.pdf"] = document.split("\n")
+        return processor.process_pdf("document.pdf", "Benchmark document", {"source": "benchmark"}, -1)
+
+    results["ingest_new_document"] = measure(
+        lambda _: ingest(make_processor(embedding_handler, FakeUploadTable())), [None], pages, trace_memory)
+    # Every chunk is already stored, so re-ingesting only hashes, looks up and re-marks them
+    stored = make_processor(embedding_handler, FakeUploadTable())
+    ingest(stored)
+    results["ingest_unchanged_document"] = measure(lambda _: ingest(stored), [None], pages, trace_memory)
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """
+    Returns:
+        list: (stage, metric, baseline value, current value) for every slowdown beyond the tolerance.
+    """
+    regressions = []
+    for stage, current in results.items():
+        previous = baseline.get(stage)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if (current[metric] > previous[metric] * (1 + tolerance)
+                    and current[metric] - previous[metric] > min_delta_ms):
+                regressions.append((stage, metric, previous[metric], current[metric]))
+        if current["peak_mb"] and previous.get("peak_mb") and current["peak_mb"] > previous["peak_mb"] * (1 + tolerance):
+            regressions.append((stage, "peak_mb", previous["peak_mb"], current["peak_mb"]))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'stage':<40} {'calls':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'items/s':>12} {'peak MB':>9}")
+    for stage, r in results.items():
+        peak = f"{r['peak_mb']:.1f}" if r["peak_mb"] is not None else "-"
+        print(f"{stage:<40} {r['calls']:>6} {r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{r['throughput']:>12.1f} {peak:>9}")
+
+
+def run(args):
+    vocabulary = make_vocabulary()
+    embedding_handler = FakeEmbeddingHandler(vocabulary, dim=args.dim)
+    trace_memory = not args.no_memory
+    results = {}
+    for size in args.sizes:
+        print(f"Retrieval over {size} chunks...", file=sys.stderr)
+        for stage, measured in benchmark_retrieval(
+                size, embedding_handler, args.queries, trace_memory, args.scan_limit).items():
+            results[f"retrieval/{size}/{stage}"] = measured
+    if not args.skip_ingestion:
+        print(f"Ingestion of {args.pages} pages...", file=sys.stderr)
+        for stage, measured in benchmark_ingestion(args.pages, vocabulary, embedding_handler, trace_memory).items():
+            results[f"ingestion/{args.pages}/{stage}"] = measured
+    print_results(results)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "dim": args.dim,
+            "queries": args.queries,
+        },
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for stage, metric, previous, current in regressions:
+            print(f"SLOWER {stage} {metric}: {previous:.3f} -> {current:.3f} ({current / previous:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No stage slower than {1 + args.tolerance:.2f}x the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="Corpus sizes in chunks; 1000000 is supported given enough memory")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries per retrieval stage")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension of the fake model")
+    parser.add_argument("--pages", type=int, default=200, help="Pages of the synthetic ingestion document")
+    parser.add_argument("--scan-limit", type=int, default=100_000,
+                        help="Largest corpus calculate_similarities is run on")
+    parser.add_argument("--skip-ingestion", action="store_true")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced run for peak memory")
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON file and exit 1 on slowdowns")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="Ignore slowdowns smaller than this, which are noise")
+    sys.exit(run(parser.parse_args()))